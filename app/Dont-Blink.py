@@ -1,167 +1,305 @@
-from PyQt5.QtWidgets import (QApplication, QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout, QComboBox, QMessageBox, QFileDialog, QCheckBox)
-from PyQt5.QtGui import QImage, QPixmap, QIcon
-from PyQt5.QtCore import QTimer, QThread, pyqtSignal
+from startup import STARTUP_REPORT, StartupTimer
+STARTUP = StartupTimer().track_imports()
+
+from PyQt5.QtWidgets import (QApplication, QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout, QComboBox, QMessageBox, QFileDialog, QCheckBox, QLineEdit, QDoubleSpinBox)
+from PyQt5.QtGui import QPixmap, QIcon
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal
 import cv2
 import sys
 import os
-import math
 import datetime
-from ultralytics import YOLO
-import requests
-import shutil
 import subprocess
+import threading
 import time
-from natsort import natsorted
-from packaging import version
-
-# show avalable cameras to user
-def list_cameras():
-    index = 0
-    available_cameras = []
-    while True:
-        cap = cv2.VideoCapture(index)
-        if not cap.isOpened():
-            break
-        available_cameras.append(str(index))
-        cap.release()
-        index += 1
-    return available_cameras
+from bestframe import BestFrameSelector
+from cameras import cached_cameras, discover_cameras
+from checkpoint import Checkpoint, find_resumable, video_settings
+from metrics import METRICS_PORT, MetricsServer
+from models import get_model
+from motion import MOTION_THRESHOLD, MotionGate
+from multicam import MultiCameraProcessor, print_stats
+from pipeline import Pipeline
+from policies import StillnessPolicy
+from preview import PreviewWorker
+from processing import process_video
+from replay import DetectionTrace, trace_path
+from sampling import SAMPLE_INTERVAL
+from sources import FrameSource, NetworkSource
+from updater import current_version, download, fetch_update_info, is_newer
+from timelapse import TimelapseWriter, build_timelapse, default_encoder, find_frames, has_segments, join_segments
+STARTUP.mark("imports done")
 
 #---------------------------------------------------------------#
 # Camera processing
 #---------------------------------------------------------------#
+def motion_gate(threshold):
+    """Returns a MotionGate for threshold, or None to run the model on every sampled frame."""
+    return MotionGate(threshold=threshold) if threshold is not None else None
+
+
 class YOLOProcessingThread(QThread):
     finished_signal = pyqtSignal()
+    timelapse_signal = pyqtSignal(str)
     
-    def __init__(self, cap, output_folder):
+    def __init__(self, cap, output_folder, timelapse=None, best_frame=False, motion_threshold=None):
         super().__init__()
         self.cap = cap
         self.output_folder = output_folder
+        self.timelapse = timelapse
+        self.best_frame = best_frame
+        self.motion_threshold = motion_threshold
+        self.pipeline = None
         self.running = True
     
     def run(self):
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        weights_path = os.path.join(BASE_DIR, "weights", "best.pt")
-        model = YOLO(weights_path)
-        
-        if self.cap.get(cv2.CAP_PROP_FPS) == 30:
-            fSkip = 7.5
-        else:
-            fSkip = math.ceil(self.cap.get(cv2.CAP_PROP_FPS)/4)
-        
-        prevX = 1
-        lastWasTheSame = False
-        wiggleRoom = 0.003
-        frame_skip = fSkip
-        frame_count = 0
-        photo_taken = False
-        
-        while self.running and self.cap.isOpened():
-            ret, frame = self.cap.read()
-            if not ret:
-                break
-
-            # extract dimensions once on first frame
-            if frame_count == 0:
-                hImg, wImg, _ = frame.shape
-
-            if frame_count % frame_skip == 0:
-                results = model.predict(frame, device="cpu")
-                frame_skip = fSkip
-                
-                for r in results:
-                    for box in r.boxes:
-                        x, y, w, h = box.xywh[0].tolist() # Get the x, y, w, h coordinates.
-                        xNorm, yNorm, wNorm, hNorm =  x/wImg, y/hImg, w/wImg, h/hImg
-                        
-                        if abs(xNorm - prevX) < wiggleRoom:
-                            prevX = xNorm
-                            if not lastWasTheSame:
-                                lastWasTheSame = True
-                            elif not photo_taken:
-                                filename = os.path.join(self.output_folder, f"frame_{frame_count}.jpg")
-                                cv2.imwrite(filename, frame)
-                                photo_taken = True
-                        else:
-                            lastWasTheSame = False
-                            photo_taken = False
-                        
-                        if prevX > xNorm:
-                            prevX = xNorm
-            frame_count += 1
-        
+        model = get_model()
+        self.pipeline = Pipeline(self.cap, self.output_folder, model, should_stop=lambda: not self.running,
+                                 motion_gate=motion_gate(self.motion_threshold), timelapse=self.timelapse,
+                                 selector=BestFrameSelector(StillnessPolicy()) if self.best_frame else None)
+        # DONT_BLINK_METRICS_PORT turns on a Prometheus endpoint for unattended prints
+        server = None
+        if METRICS_PORT:
+            try:
+                server = MetricsServer(lambda: (self.pipeline.stats(), self.pipeline.stages)).start()
+            except OSError as e:
+                print(f"⚠️ Could not start the metrics endpoint: {e}")
+        try:
+            stats = self.pipeline.run()
+        finally:
+            if server is not None:
+                server.stop()
+        if self.timelapse is not None:
+            video_path = self.timelapse.close()
+            if video_path:
+                self.timelapse_signal.emit(video_path)
+        print(f"📊 {stats['inferred']} frames inferred, {stats['skipped']} skipped without motion, "
+              f"{stats['captures']} photos, {stats['dropped']} frames dropped")
+        for name, stage in stats["stages"].items():
+            print(f"   {name}: {stage['avg_ms']:.1f} ms avg, {stage['max_ms']:.1f} ms max")
         self.finished_signal.emit()
+
+    def stats(self):
+        """Returns the live counters of the running pipeline, or None before it started."""
+        return self.pipeline.stats() if self.pipeline is not None else None
     
     def stop(self):
         self.running = False
+        self.cap.release()
+
+
+class MultiCameraProcessingThread(QThread):
+    finished_signal = pyqtSignal()
+    timelapse_signal = pyqtSignal(str)
+
+    def __init__(self, cameras, timelapses=None, best_frame=False, motion_threshold=None):
+        """cameras is a list of (name, cap, session_folder), timelapses maps names to TimelapseWriters."""
+        super().__init__()
+        self.cameras = cameras
+        self.timelapses = timelapses or {}
+        self.best_frame = best_frame
+        self.motion_threshold = motion_threshold
+        self.running = True
+
+    def run(self):
+        processor = MultiCameraProcessor(get_model(), should_stop=lambda: not self.running)
+        for name, cap, session_folder in self.cameras:
+            selector = BestFrameSelector(StillnessPolicy()) if self.best_frame else None
+            processor.add_camera(name, cap, session_folder, motion_gate=motion_gate(self.motion_threshold),
+                                 timelapse=self.timelapses.get(name), selector=selector)
+        stats = processor.run()
+        for timelapse in self.timelapses.values():
+            video_path = timelapse.close()
+            if video_path:
+                self.timelapse_signal.emit(video_path)
+        print_stats(stats)
+        self.finished_signal.emit()
+
+    def stop(self):
+        self.running = False
+        for _, cap, _ in self.cameras:
+            cap.release()
 
 
 class YOLOVideoProcessingThread(QThread):
     finished_signal = pyqtSignal()
+    timelapse_signal = pyqtSignal(str)
     
-    def __init__(self, video_path, output_folder):
+    def __init__(self, video_path, output_folder, timelapse=None, best_frame=False, checkpoint=None,
+                 motion_threshold=None):
         super().__init__()
         self.video_path = video_path
         self.output_folder = output_folder
+        self.timelapse = timelapse
+        self.best_frame = best_frame
+        self.checkpoint = checkpoint
+        self.motion_threshold = motion_threshold
         self.running = True
     
     def run(self):
-        self.cap = cv2.VideoCapture(self.video_path)
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        weights_path = os.path.join(BASE_DIR, "weights", "best.pt")
-        model = YOLO(weights_path)
-        
-        if self.cap.get(cv2.CAP_PROP_FPS) == 30:
-            fSkip = 7.5
-        else:
-            fSkip = math.ceil(self.cap.get(cv2.CAP_PROP_FPS)/4)
-        
-        prevX = 1
-        lastWasTheSame = False
-        wiggleRoom = 0.003
-        frame_skip = fSkip
-        frame_count = 0
-        photo_taken = False
-        
-        while self.running and self.cap.isOpened():
-            ret, frame = self.cap.read()
-            if not ret:
-                break
-
-            # extract dimensions once on first frame
-            if frame_count == 0:
-                hImg, wImg, _ = frame.shape
-
-            if frame_count % frame_skip == 0:
-                results = model.predict(frame, device="cpu")
-                frame_skip = fSkip
-                
-                for r in results:
-                    for box in r.boxes:
-                        x, y, w, h = box.xywh[0].tolist() # Get the x, y, w, h coordinates.
-                        xNorm, yNorm, wNorm, hNorm =  x/wImg, y/hImg, w/wImg, h/hImg
-                        
-                        if abs(xNorm - prevX) < wiggleRoom:
-                            prevX = xNorm
-                            if not lastWasTheSame:
-                                lastWasTheSame = True
-                            elif not photo_taken:
-                                filename = os.path.join(self.output_folder, f"frame_{frame_count}.jpg")
-                                cv2.imwrite(filename, frame)
-                                photo_taken = True
-                        else:
-                            lastWasTheSame = False
-                            photo_taken = False
-                        
-                        if prevX > xNorm:
-                            prevX = xNorm
-            frame_count += 1
-        
+        model = get_model()
+        gate = motion_gate(self.motion_threshold)
+        trace = DetectionTrace()
+        selector = BestFrameSelector(StillnessPolicy()) if self.best_frame else None
+        stats = process_video(self.video_path, self.output_folder, model, should_stop=lambda: not self.running,
+                              motion_gate=gate, timelapse=self.timelapse, trace=trace, selector=selector,
+                              checkpoint=self.checkpoint)
+        # a stopped or resumed run only has part of the video, so it can't be replayed
+        if self.running and not stats["resumed_from"]:
+            try:
+                trace.save(trace_path(self.video_path, motion_gate=gate))
+            except OSError as e:
+                print(f"⚠️ Could not save the detection trace: {e}")
+        if self.timelapse is not None:
+            video_path = self.timelapse.close()
+            if video_path:
+                self.timelapse_signal.emit(video_path)
+        print(f"📊 {stats['frames']} frames in {stats['seconds']:.1f}s, {stats['inferred']} inferred, "
+              f"{stats['skipped']} skipped without motion, {stats['captures']} photos")
         self.finished_signal.emit()
     
     def stop(self):
         self.running = False
 
+
+class CameraDiscoveryThread(QThread):
+    cameras_found = pyqtSignal(list)
+
+    def run(self):
+        self.cameras_found.emit([str(index) for index in discover_cameras(refresh=True)])
+
+
+class StreamConnectThread(QThread):
+    """Connects to a network camera, which can take up to the open timeout, off the GUI thread."""
+    connected_signal = pyqtSignal(object)
+    failed_signal = pyqtSignal(str)
+
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+        self.source = None
+
+    def run(self):
+        source = NetworkSource(self.url)
+        if not source.cap.isOpened():
+            source.stop()
+            self.failed_signal.emit(self.url)
+            return
+        self.source = source
+        self.connected_signal.emit(source)
+
+
+class ModelWarmUp(QObject):
+    """Imports torch and ultralytics and loads the model while the window is already usable.
+
+    The load runs on a daemon thread instead of a QThread, so closing the window
+    never has to wait for it.
+    """
+    ready_signal = pyqtSignal()
+    failed_signal = pyqtSignal(str)
+
+    def start(self):
+        threading.Thread(target=self.run, name="model-warm-up", daemon=True).start()
+
+    def run(self):
+        try:
+            get_model()
+        except Exception as e:
+            self.failed_signal.emit(str(e))
+            return
+        self.ready_signal.emit()
+
+
+class UpdateCheckThread(QThread):
+    update_available = pyqtSignal(object)
+    unverified_signal = pyqtSignal(object)
+    up_to_date = pyqtSignal()
+    failed_signal = pyqtSignal(str)
+
+    def run(self):
+        try:
+            info = fetch_update_info()
+            # Read the current version (If it doesn’t exist, default to "0.0")
+            if not is_newer(info.version, current_version(default="0.0")):
+                self.up_to_date.emit()
+            elif info.sha256 is None:
+                # download() refuses an update it can't verify, so it isn't offered
+                self.unverified_signal.emit(info)
+            else:
+                self.update_available.emit(info)
+        except Exception as e:
+            self.failed_signal.emit(str(e))
+
+
+class UpdateDownloadThread(QThread):
+    progress_signal = pyqtSignal(int, int)
+    finished_signal = pyqtSignal(str)
+    failed_signal = pyqtSignal(str)
+
+    def __init__(self, info, path):
+        super().__init__()
+        self.info = info
+        self.path = path
+        self.running = True
+
+    def run(self):
+        try:
+            # one partial file per version, so a resumed download never mixes two releases
+            download(self.info.url, self.path, sha256=self.info.sha256, progress=self.progress_signal.emit,
+                     should_stop=lambda: not self.running, part_path=f"{self.path}.{self.info.version}.part")
+        except Exception as e:
+            self.failed_signal.emit(str(e))
+            return
+        self.finished_signal.emit(self.path)
+
+    def stop(self):
+        self.running = False
+
+
+class TimelapseThread(QThread):
+    """Builds the timelapse of every session folder, a folder that fails doesn't stop the others."""
+    progress_signal = pyqtSignal(int, int)
+    finished_signal = pyqtSignal(list)
+    failed_signal = pyqtSignal(str)
+
+    def __init__(self, session_folders):
+        super().__init__()
+        self.session_folders = session_folders
+        self.running = True
+
+    def run(self):
+        videos = []
+        errors = []
+        for session_folder in self.session_folders:
+            if not self.running:
+                return
+            name = os.path.basename(session_folder)
+            try:
+                # an unfinished live timelapse is quicker to stitch than re-encoding every photo
+                if has_segments(session_folder):
+                    video_path, _ = join_segments(session_folder, progress=self.progress_signal.emit,
+                                                  should_stop=lambda: not self.running)
+                elif not find_frames(session_folder):
+                    # e.g. a camera that never saw the printhead park
+                    print(f"⚠️ {name}: no photos, no timelapse")
+                    continue
+                else:
+                    video_path, _ = build_timelapse(session_folder, progress=self.progress_signal.emit,
+                                                    should_stop=lambda: not self.running,
+                                                    encoder=default_encoder())
+            except Exception as e:
+                print(f"❌ {name}: {e}")
+                errors.append(f"{name}: {e}")
+                continue
+            print(f"🎬 {name}: {video_path}")
+            videos.append(video_path)
+        if errors or not videos:
+            self.failed_signal.emit("\n".join(errors) or "No images found in the session folders to create a timelapse.")
+        if videos:
+            self.finished_signal.emit(videos)
+
+    def stop(self):
+        self.running = False
+
 #---------------------------------------------------------------#
 # Camera App
 #---------------------------------------------------------------#
@@ -192,23 +330,27 @@ class CameraApp(QWidget):
 
         self.update_input_selection()
 
+        # runs once the event loop is up, i.e. after the window was shown
+        QTimer.singleShot(0, self.window_ready)
+
     #---------------------------------------------------------------#
     # Load inital variables
 
     def initialize_variables(self):
         """Initialize essential variables and configurations."""
-        self.cap = None
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_preview)
+        self.source = None
+        self.source_camera = None
+        self.preview_worker = None
         self.output_folder = ""
         self.current_session_folder = ""
+        self.session_folders = []
+        self.camera_sources = {}
         self.processing_thread = None
-        self.video_processing_thread = None
-
-        # Load YOLO Model
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        weights_path = os.path.join(BASE_DIR, "weights", "best.pt")
-        self.model = YOLO(weights_path)
+        self.timelapse_thread = None
+        self.update_thread = None
+        self.warm_up = None
+        self.stream_connect = None
+        self.start_when_connected = False
 
         # Adjust UI Elements' Sizes
         self.camera_selection.setFixedWidth(50)
@@ -234,21 +376,8 @@ class CameraApp(QWidget):
         """Creates the top title bar with update button."""
         title_layout = QHBoxLayout()
 
-        # Get Version Number
-        if getattr(sys, 'frozen', False):
-            base_path = sys._MEIPASS  # PyInstaller temp extraction folder
-        else:
-            base_path = os.path.dirname(__file__)  # Running from source
-
-        current_version_path = os.path.join(base_path, "version.txt")
-
-        current_version = "Unknown"
-        if os.path.exists(current_version_path):
-            with open(current_version_path, "r") as f:
-                current_version = f.read().strip()
-
         # Set window title with version
-        self.setWindowTitle(f"Dont-Blink v{current_version}")
+        self.setWindowTitle(f"Dont-Blink v{current_version()}")
 
         title_layout.addStretch()  # Pushes the update button to the right
 
@@ -265,9 +394,9 @@ class CameraApp(QWidget):
         self.layout.addWidget(title_container)
 
     def create_input_selection(self):
-        """Creates the input selection dropdown for Webcam/MP4."""
+        """Creates the input selection dropdown for Webcam/Network Stream/MP4."""
         self.input_selection = QComboBox()
-        self.input_selection.addItems(["Webcam", "MP4 File"])
+        self.input_selection.addItems(["Webcam", "Network Stream", "MP4 File"])
         self.input_selection.currentIndexChanged.connect(self.update_input_selection)
         self.layout.addWidget(self.input_selection)
 
@@ -277,11 +406,14 @@ class CameraApp(QWidget):
 
         # Camera selection (Initially hidden)
         self.camera_selection = QComboBox()
-        self.available_cameras = list_cameras()
-        if not self.available_cameras:
-            self.available_cameras.append("No cameras found")
-        self.camera_selection.addItems(self.available_cameras)
+        # show the cameras found last time right away, the search runs in the background
+        cached = cached_cameras()
+        self.available_cameras = [str(index) for index in cached] if cached else []
+        self.camera_selection.addItems(self.available_cameras or ["Searching..."])
         self.camera_selection.setVisible(False)
+        self.camera_discovery = CameraDiscoveryThread()
+        self.camera_discovery.cameras_found.connect(self.update_cameras)
+        self.camera_discovery.start()
         self.input_method_layout.addWidget(self.camera_selection)
 
         # Confirm Camera button (Initially hidden)
@@ -290,6 +422,23 @@ class CameraApp(QWidget):
         self.select_button.setVisible(False)
         self.input_method_layout.addWidget(self.select_button)
 
+        # All cameras checkbox (Initially hidden)
+        self.check_all_cameras = QCheckBox("All cameras")
+        self.check_all_cameras.setToolTip("Process every connected camera, each into its own session folder")
+        self.check_all_cameras.setVisible(False)
+        self.input_method_layout.addWidget(self.check_all_cameras)
+
+        # Stream URL and Connect button (Initially hidden)
+        self.stream_url = QLineEdit()
+        self.stream_url.setPlaceholderText("http://printer/webcam/?action=stream or rtsp://...")
+        self.stream_url.setVisible(False)
+        self.input_method_layout.addWidget(self.stream_url)
+
+        self.connect_button = QPushButton("Connect")
+        self.connect_button.clicked.connect(lambda: self.select_stream())
+        self.connect_button.setVisible(False)
+        self.input_method_layout.addWidget(self.connect_button)
+
         # Select Video File button (Initially hidden)
         self.select_video_button = QPushButton("Select MP4 File")
         self.select_video_button.clicked.connect(self.select_video_file)
@@ -311,6 +460,7 @@ class CameraApp(QWidget):
         preview_layout.addWidget(self.camera_preview_label)
 
         self.check_detection = QCheckBox("Preview detection")
+        self.check_detection.toggled.connect(self.toggle_preview_detection)
         preview_layout.addWidget(self.check_detection)
 
         # Container for Preview & Checkbox
@@ -361,6 +511,29 @@ class CameraApp(QWidget):
         self.timelapse_button.clicked.connect(self.create_timelapse)
         timelapse_layout.addWidget(self.timelapse_button)
 
+        self.check_live_timelapse = QCheckBox("Live timelapse")
+        self.check_live_timelapse.setToolTip("Write the timelapse video while processing runs")
+        timelapse_layout.addWidget(self.check_live_timelapse)
+
+        self.check_best_frame = QCheckBox("Best frame")
+        self.check_best_frame.setToolTip("Save the sharpest frame while the printhead is parked instead of the first")
+        timelapse_layout.addWidget(self.check_best_frame)
+
+        self.check_motion = QCheckBox("Skip still frames")
+        self.check_motion.setToolTip("Reuse the last detection while the picture doesn't change instead of running the "
+                                     "model, faster but a photo can move by a sampled frame")
+        timelapse_layout.addWidget(self.check_motion)
+
+        self.motion_threshold_input = QDoubleSpinBox()
+        self.motion_threshold_input.setDecimals(3)
+        self.motion_threshold_input.setRange(0.001, 0.1)
+        self.motion_threshold_input.setSingleStep(0.001)
+        self.motion_threshold_input.setValue(MOTION_THRESHOLD)
+        self.motion_threshold_input.setToolTip("Share of the pixels that must change to run the model again")
+        self.motion_threshold_input.setEnabled(False)
+        self.check_motion.toggled.connect(self.motion_threshold_input.setEnabled)
+        timelapse_layout.addWidget(self.motion_threshold_input)
+
         self.status_label = QLabel("Status:")
         timelapse_layout.addWidget(self.status_label)
 
@@ -369,20 +542,66 @@ class CameraApp(QWidget):
         timelapse_container.setMaximumWidth(600)
         self.layout.addWidget(timelapse_container)
 
+        # ----- Live Metrics -----
+        self.metrics_label = QLabel("")
+        self.metrics_label.setVisible(False)
+        self.layout.addWidget(self.metrics_label)
+
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.setInterval(1000)
+        self.metrics_timer.timeout.connect(self.update_metrics)
+
+    #---------------------------------------------------------------#
+    # Startup
+
+    def window_ready(self):
+        """Reports the startup time and loads the model in the background."""
+        STARTUP.stop_tracking()
+        seconds = STARTUP.mark("window shown")
+        print(f"🚀 Window ready after {seconds:.2f}s")
+        if STARTUP_REPORT:
+            print("\n".join(STARTUP.report()))
+
+        self.status_label.setText("Status: Loading model...")
+        self.warm_up = ModelWarmUp()
+        self.warm_up.ready_signal.connect(self.model_ready)
+        self.warm_up.failed_signal.connect(self.model_failed)
+        self.warm_up.start()
+
+    def model_ready(self):
+        print(f"🧠 Model ready after {STARTUP.mark('model ready'):.1f}s")
+        # don't overwrite a timelapse status that came in meanwhile
+        if self.status_label.text() == "Status: Loading model...":
+            self.status_label.setText("Status: Ready")
+
+    def model_failed(self, message):
+        print(f"⚠️ Could not load the model: {message}")
+        if self.status_label.text() == "Status: Loading model...":
+            self.status_label.setText("Status: Model not loaded")
+
     #---------------------------------------------------------------#
     # Input Types
     def update_input_selection(self):
         """Show the correct UI elements based on input selection"""
         selected_input = self.input_selection.currentText()
 
-        if selected_input == "Webcam":
-            self.camera_selection.setVisible(True)
-            self.select_button.setVisible(True)
-            self.select_video_button.setVisible(False)
-        else:
-            self.camera_selection.setVisible(False)
-            self.select_button.setVisible(False)
-            self.select_video_button.setVisible(True)
+        webcam = selected_input == "Webcam"
+        stream = selected_input == "Network Stream"
+        self.camera_selection.setVisible(webcam)
+        self.select_button.setVisible(webcam)
+        self.check_all_cameras.setVisible(webcam)
+        self.stream_url.setVisible(stream)
+        self.connect_button.setVisible(stream)
+        self.select_video_button.setVisible(selected_input == "MP4 File")
+
+    def update_cameras(self, cameras):
+        """Fills the camera list with the result of the background search, keeping the selection."""
+        selected = self.camera_selection.currentText()
+        self.available_cameras = cameras
+        self.camera_selection.clear()
+        self.camera_selection.addItems(cameras or ["No cameras found"])
+        if selected in cameras:
+            self.camera_selection.setCurrentText(selected)
 
     def select_video_file(self):
         """Let the user choose an MP4 file as input."""
@@ -390,17 +609,62 @@ class CameraApp(QWidget):
         if file_path:
             self.video_file = file_path
             QMessageBox.information(self, "Video Selected", f"Using video file: {os.path.basename(file_path)}")
-            self.cap = cv2.VideoCapture(self.video_file)
-            self.is_video = True
-            self.timer.start(50)
+            # the preview plays the file in a loop, processing opens its own copy
+            self.open_source(FrameSource(cv2.VideoCapture(self.video_file), loop=True, realtime=True))
 
     def select_camera(self):
-        if self.cap is not None:
-            self.cap.release()
-        self.selected_camera = int(self.camera_selection.currentText())
-        self.cap = cv2.VideoCapture(self.selected_camera)
-        self.is_video = False
-        self.timer.start(50)
+        selected_text = self.camera_selection.currentText()
+        # "Searching..." or "No cameras found" while there is no camera to pick
+        if not selected_text.isdigit():
+            QMessageBox.warning(self, "No Camera", "No camera found yet, please wait for the search or connect one.")
+            return
+        self.selected_camera = int(selected_text)
+        # a camera already opened for an all-cameras run is reused instead of opened twice
+        source = self.camera_sources.pop(self.selected_camera, None)
+        if source is None or not source.alive:
+            source = FrameSource(cv2.VideoCapture(self.selected_camera))
+        self.open_source(source)
+        self.source_camera = self.selected_camera
+
+    def select_stream(self):
+        """Connects to the network camera at the entered URL in the background, returns False if there is none."""
+        url = self.stream_url.text().strip()
+        if "://" not in url:
+            QMessageBox.warning(self, "No Stream URL", "Please enter the URL of the camera stream.")
+            return False
+        if self.stream_connect is not None and self.stream_connect.isRunning():
+            return True
+        self.connect_button.setEnabled(False)
+        self.connect_button.setText("Connecting...")
+        self.stream_connect = StreamConnectThread(url)
+        self.stream_connect.connected_signal.connect(self.stream_connected)
+        self.stream_connect.failed_signal.connect(self.stream_failed)
+        self.stream_connect.start()
+        return True
+
+    def stream_connected(self, source):
+        self.connect_button.setEnabled(True)
+        self.connect_button.setText("Connect")
+        self.open_source(source)
+        # Start was pressed before the stream was connected
+        if self.start_when_connected:
+            self.start_when_connected = False
+            self.start_processing()
+
+    def stream_failed(self, url):
+        self.connect_button.setEnabled(True)
+        self.connect_button.setText("Connect")
+        self.start_when_connected = False
+        QMessageBox.critical(self, "Error", f"Could not connect to {url}.")
+
+    def open_source(self, source):
+        """Replaces the current frame source and restarts the preview on it."""
+        self.stop_preview()
+        if self.source is not None:
+            self.source.stop()
+        self.source = source
+        self.source_camera = None
+        self.start_preview()
     
     #---------------------------------------------------------------#
     # Processing & Updates
@@ -409,42 +673,129 @@ class CameraApp(QWidget):
         if not self.output_folder:
             QMessageBox.warning(self, "No Output Folder", "Please select an output folder before starting processing.")
             return
-        
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        self.current_session_folder = os.path.join(self.output_folder, f"session_{timestamp}")
-        os.makedirs(self.current_session_folder, exist_ok=True)
 
         self.input_type = self.input_selection.currentText()
 
         if self.input_type == "Webcam":
             selected_text = self.camera_selection.currentText()
-            self.selected_camera = int(selected_text)
-            self.cap = cv2.VideoCapture(self.selected_camera)
+            if not selected_text.isdigit():
+                QMessageBox.warning(self, "No Camera", "Please connect a camera before starting processing.")
+                return
+            # share the camera with the preview instead of opening it a second time
+            if self.source is None or self.source_camera != int(selected_text) or not self.source.alive:
+                self.select_camera()
+
+        elif self.input_type == "Network Stream":
+            # a stream that is already previewed is shared, a dropped one reconnects by itself
+            connected = (isinstance(self.source, NetworkSource) and self.source.alive
+                         and self.source.url == self.stream_url.text().strip())
+            if not connected:
+                # processing starts once the stream is connected
+                self.start_when_connected = self.select_stream()
+                return
 
         elif self.input_type == "MP4 File":
             if not hasattr(self, 'video_file') or not self.video_file:
                 QMessageBox.warning(self, "No Video Selected", "Please select a video file before starting processing.")
                 return
-            self.cap = cv2.VideoCapture(self.video_file)  # Open video file
-            if not self.cap.isOpened():
+            cap = cv2.VideoCapture(self.video_file)  # Open video file
+            if not cap.isOpened():
                 QMessageBox.critical(self, "Error", "Could not open the selected video file.")
                 return
-            ret, frame = self.cap.read()
+            ret, frame = cap.read()
+            cap.release()
             if not ret:
                 QMessageBox.critical(self, "Error", "Could not read the first frame of the video.")
                 return
             print(f"🎥 First frame read successfully: {frame.shape}")
 
-        self.processing_thread = YOLOProcessingThread(self.cap, self.current_session_folder)
-        self.video_processing_thread = YOLOVideoProcessingThread(self.cap, self.current_session_folder)
+        motion_threshold = self.motion_threshold_input.value() if self.check_motion.isChecked() else None
+        resume_folder = None
+        if self.input_type == "MP4 File":
+            settings = video_settings(self.video_file, SAMPLE_INTERVAL, StillnessPolicy.name,
+                                      self.check_best_frame.isChecked(), motion_gate=motion_gate(motion_threshold))
+            resume_folder = find_resumable(self.output_folder, settings)
+            if resume_folder is not None:
+                reply = QMessageBox.question(self, "Resume Processing",
+                                             f"{os.path.basename(self.video_file)} was stopped before the end in "
+                                             f"{os.path.basename(resume_folder)}. Continue where it stopped?",
+                                             QMessageBox.Yes | QMessageBox.No)
+                if reply != QMessageBox.Yes:
+                    resume_folder = None
+
+        # preview detection would run on the shared model next to processing, so it is switched off first
+        # and the preview restarted, which waits for a detection that is still running
+        detecting = self.check_detection.isChecked()
+        self.check_detection.setChecked(False)
+        self.check_detection.setEnabled(False)
+        if detecting and self.preview_worker is not None:
+            self.start_preview()
+
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        if self.input_type == "Webcam" and self.check_all_cameras.isChecked():
+            self.processing_thread = self.start_all_cameras(timestamp, motion_threshold)
+        else:
+            self.current_session_folder = resume_folder or os.path.join(self.output_folder, f"session_{timestamp}")
+            os.makedirs(self.current_session_folder, exist_ok=True)
+            self.session_folders = [self.current_session_folder]
+
+            timelapse = None
+            # a resumed session builds its timelapse from the photos afterwards
+            if self.check_live_timelapse.isChecked() and resume_folder is None:
+                timelapse = TimelapseWriter(self.current_session_folder, encoder=default_encoder())
+
+            if self.input_type != "MP4 File":
+                self.processing_thread = YOLOProcessingThread(self.source.subscribe(), self.current_session_folder,
+                                                              timelapse, self.check_best_frame.isChecked(),
+                                                              motion_threshold)
+            else:
+                self.processing_thread = YOLOVideoProcessingThread(self.video_file, self.current_session_folder,
+                                                                   timelapse, self.check_best_frame.isChecked(),
+                                                                   Checkpoint(self.current_session_folder, settings),
+                                                                   motion_threshold)
         self.processing_thread.finished_signal.connect(self.processing_finished)
-        self.video_processing_thread.finished_signal.connect(self.processing_finished)
+        self.processing_thread.timelapse_signal.connect(self.timelapse_finished)
+        # a live timelapse is still being finished until the thread is done
+        self.processing_thread.finished.connect(lambda: self.timelapse_button.setEnabled(True))
         self.processing_thread.start()
+        if isinstance(self.processing_thread, YOLOProcessingThread):
+            self.metrics_timer.start()
 
         self.start_button.setEnabled(False)
+        self.timelapse_button.setEnabled(False)
+        self.check_live_timelapse.setEnabled(False)
+        self.check_best_frame.setEnabled(False)
+        self.check_motion.setEnabled(False)
+        self.motion_threshold_input.setEnabled(False)
         self.stop_button.setEnabled(True)
-        self.check_detection.setChecked(False)
-        self.check_detection.setEnabled(False)
+
+    def start_all_cameras(self, timestamp, motion_threshold=None):
+        """Creates a session folder per connected camera and a thread that processes all of them."""
+        cameras = []
+        timelapses = {}
+        self.session_folders = []
+        for camera in self.available_cameras:
+            if not camera.isdigit():
+                continue
+            index = int(camera)
+            # the previewed camera is shared, the others get a source of their own
+            if index == self.source_camera and self.source.alive:
+                source = self.source
+            else:
+                source = self.camera_sources.get(index)
+                if source is None or not source.alive:
+                    source = FrameSource(cv2.VideoCapture(index))
+                    self.camera_sources[index] = source
+
+            name = f"cam{index}"
+            session_folder = os.path.join(self.output_folder, f"session_{timestamp}_{name}")
+            os.makedirs(session_folder, exist_ok=True)
+            self.session_folders.append(session_folder)
+            cameras.append((name, source.subscribe(), session_folder))
+            if self.check_live_timelapse.isChecked():
+                timelapses[name] = TimelapseWriter(session_folder, encoder=default_encoder())
+        self.current_session_folder = self.session_folders[0]
+        return MultiCameraProcessingThread(cameras, timelapses, self.check_best_frame.isChecked(), motion_threshold)
 
     def stop_processing(self):
         if self.processing_thread:
@@ -452,69 +803,98 @@ class CameraApp(QWidget):
         self.processing_finished()
     
     def processing_finished(self):
+        self.metrics_timer.stop()
+        self.update_metrics()
         self.start_button.setEnabled(True)
         self.stop_button.setEnabled(False)
         self.check_detection.setEnabled(True)
+        self.check_live_timelapse.setEnabled(True)
+        self.check_best_frame.setEnabled(True)
+        self.check_motion.setEnabled(True)
+        self.motion_threshold_input.setEnabled(self.check_motion.isChecked())
+        # cameras opened only for an all-cameras run would otherwise keep decoding, the preview keeps its own
+        for source in self.camera_sources.values():
+            source.stop()
+        self.camera_sources.clear()
+
+    def update_metrics(self):
+        """Shows throughput, inference latency and lag of the running camera session."""
+        stats = None
+        if isinstance(self.processing_thread, YOLOProcessingThread):
+            stats = self.processing_thread.stats()
+        if stats is None:
+            return
+        inference = stats["stages"]["inference"]
+        text = (f"Live: {stats['inferred']} inferred, {stats['skipped']} skipped, "
+                f"{stats['captures']} photos, {stats['dropped']} dropped | "
+                f"inference {inference['avg_ms']:.0f} ms, lag {stats['lag_seconds']:.1f}s")
+        source = stats["source"]
+        if source is not None and source["reconnects"]:
+            text += f", {source['reconnects']} reconnects"
+        self.metrics_label.setText(text)
+        self.metrics_label.setVisible(True)
 
     #---------------------------------------------------------------#
     # Updater
 
     def check_for_updates(self):
-        latest_version_url = "https://smoothyy3.github.io/Dont-Blink/latest_version.txt"  # Your GitHub Pages URL
-
-        # Determine if running from a bundled PyInstaller EXE
-        if getattr(sys, 'frozen', False):
-            base_path = sys._MEIPASS  # PyInstaller temp extraction folder
+        """Checks for a new version in the background, the window stays responsive."""
+        if self.update_thread is not None and self.update_thread.isRunning():
+            return
+        self.update_button.setEnabled(False)
+        self.update_button.setText("Checking...")
+        self.update_thread = UpdateCheckThread()
+        self.update_thread.update_available.connect(self.update_available)
+        self.update_thread.up_to_date.connect(self.update_up_to_date)
+        self.update_thread.unverified_signal.connect(
+            lambda info: self.update_failed("Update Available", f"Version {info.version} is available, but its "
+                                            "checksum isn't published, so it can't be installed from here. "
+                                            "Please download it from the releases page."))
+        self.update_thread.failed_signal.connect(
+            lambda message: self.update_failed("Error", f"Failed to check for updates: {message}"))
+        self.update_thread.start()
+
+    def update_available(self, info):
+        reply = QMessageBox.question(self, "Update Available",
+                                     f"A new version ({info.version}) is available. Do you want to update?",
+                                     QMessageBox.Yes | QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            self.download_and_replace(info)
         else:
-            base_path = os.path.dirname(__file__)  # Running from source
-
-        current_version_path = os.path.join(base_path, "version.txt")
-
-        try:
-            # Read the current version (If it doesn’t exist, default to "0.0")
-            if not os.path.exists(current_version_path):
-                current_version = "0.0"
-            else:
-                with open(current_version_path, "r") as f:
-                    current_version = f.read().strip()
-
-            # Fetch the latest version info
-            response = requests.get(latest_version_url)
-            response.raise_for_status()
-
-            latest_version_info = response.text.split("\n")
-            latest_version = latest_version_info[0].strip()
-            download_url = latest_version_info[1].strip()  # URL of new .exe
-
-            # Use proper version comparison
-            if version.parse(latest_version) > version.parse(current_version):
-                reply = QMessageBox.question(self, "Update Available", 
-                                            f"A new version ({latest_version}) is available. Do you want to update?",
-                                            QMessageBox.Yes | QMessageBox.No)
-                if reply == QMessageBox.Yes:
-                    self.download_and_replace(download_url, latest_version)
-            else:
-                QMessageBox.information(self, "No Updates", "You have the latest version.")
-
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to check for updates: {e}")
-
-    def download_and_replace(self, url, latest_version):
-        """Downloads the new version and replaces the running executable safely."""
-        
-        # Paths
-        current_exe = sys.executable
-        temp_exe = os.path.join(os.path.dirname(current_exe), "Dont-Blink-Temp.exe")
-        backup_exe = os.path.join(os.path.dirname(current_exe), "Dont-Blink-Old.exe")
-        update_script = os.path.join(os.path.dirname(current_exe), "update_script.bat")
+            self.reset_update_button()
+
+    def update_up_to_date(self):
+        self.reset_update_button()
+        QMessageBox.information(self, "No Updates", "You have the latest version.")
+
+    def update_failed(self, title, message):
+        self.reset_update_button()
+        QMessageBox.critical(self, title, message)
+
+    def reset_update_button(self):
+        self.update_button.setEnabled(True)
+        self.update_button.setText("Check for Update")
+
+    def download_and_replace(self, info):
+        """Downloads the new version in the background, an interrupted download resumes next time."""
+        temp_exe = os.path.join(os.path.dirname(sys.executable), "Dont-Blink-Temp.exe")
+        self.update_thread = UpdateDownloadThread(info, temp_exe)
+        self.update_thread.progress_signal.connect(self.update_progress)
+        self.update_thread.finished_signal.connect(self.replace_executable)
+        self.update_thread.failed_signal.connect(
+            lambda message: self.update_failed("Update Failed", f"Could not download update: {message}"))
+        self.update_thread.start()
+
+    def update_progress(self, done, total):
+        if total:
+            self.update_button.setText(f"Downloading {done * 100 // total}%")
+        else:
+            self.update_button.setText(f"Downloading {done / 1e6:.1f} MB")
 
+    def replace_executable(self, temp_exe):
+        """Replaces the running executable with the downloaded one safely."""
+        update_script = os.path.join(os.path.dirname(sys.executable), "update_script.bat")
         try:
-            # Download the new exe
-            with requests.get(url, stream=True) as r:
-                r.raise_for_status()
-                with open(temp_exe, 'wb') as f:
-                    shutil.copyfileobj(r.raw, f)
-
             QMessageBox.information(self, "Update Ready", "Update downloaded! Please Restart")
 
             # Create an update script that waits before replacing the exe
@@ -533,38 +913,58 @@ class CameraApp(QWidget):
             sys.exit(0)
 
         except Exception as e:
-            QMessageBox.critical(self, "Update Failed", f"Could not download update: {e}")
-    
+            self.update_failed("Update Failed", f"Could not install update: {e}")
+
     #---------------------------------------------------------------#
     # Camera/ Video Preview
-    def update_preview(self):
-        if self.cap is not None and self.cap.isOpened():
-            ret, frame = self.cap.read()
-
-            if self.is_video and not ret:
-                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Restart video
-                ret, frame = self.cap.read()
-
-            if ret:
-                if self.check_detection.isChecked():
-                    results = self.model(frame, conf=0.5)
-                    for r in results:
-                        for box in r.boxes:
-                            x, y, w, h = box.xywh[0].tolist()
-                            x_min, y_min = int(x - w / 2), int(y - h / 2)
-                            x_max, y_max = int(x + w / 2), int(y + h / 2)
-                            cv2.rectangle(frame, (x_min, y_min), (x_max, y_max), (0, 255, 0), 2)
-                            cv2.putText(frame, f"Conf: {box.conf[0]:.2f}", (x_min, y_min - 10),
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                h, w, ch = frame_rgb.shape
-                bytes_per_line = ch * w
-                qimg = QImage(frame_rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
-                pixmap = QPixmap.fromImage(qimg).scaled(426, 240)
-                self.camera_preview_label.setPixmap(pixmap)
-        else:
-            self.timer.stop() 
+    def start_preview(self):
+        """(Re)starts the background preview worker on the current frame source."""
+        self.stop_preview()
+        self.preview_worker = PreviewWorker(self.source.subscribe(), self.check_detection.isChecked())
+        self.preview_worker.frame_ready.connect(self.show_preview_frame)
+        self.preview_worker.start()
+
+    def stop_preview(self):
+        if self.preview_worker is not None:
+            self.preview_worker.stop()
+            self.preview_worker.wait()
+            self.preview_worker = None
+
+    def show_preview_frame(self):
+        if self.preview_worker is None:
+            return
+        image = self.preview_worker.take_frame()
+        if image is not None:
+            self.camera_preview_label.setPixmap(QPixmap.fromImage(image))
+
+    def toggle_preview_detection(self, enabled):
+        if self.preview_worker is not None:
+            self.preview_worker.set_detection(enabled)
+
+    def closeEvent(self, event):
+        # a camera that hangs while probed holds the search for at most its timeout
+        self.camera_discovery.wait()
+        if self.stream_connect is not None:
+            self.stream_connect.wait()
+            # a stream connected after the window started closing never reached the preview
+            if self.stream_connect.source is not None and self.stream_connect.source is not self.source:
+                self.stream_connect.source.stop()
+        self.stop_preview()
+        if self.processing_thread is not None:
+            self.processing_thread.stop()
+            self.processing_thread.wait()
+        if self.timelapse_thread is not None:
+            self.timelapse_thread.stop()
+            self.timelapse_thread.wait()
+        if self.update_thread is not None:
+            if isinstance(self.update_thread, UpdateDownloadThread):
+                self.update_thread.stop()
+            self.update_thread.wait()
+        if self.source is not None:
+            self.source.stop()
+        for source in self.camera_sources.values():
+            source.stop()
+        super().closeEvent(event)
     
     #---------------------------------------------------------------#
     # Select Ouputfolder
@@ -580,36 +980,36 @@ class CameraApp(QWidget):
         if not self.current_session_folder:
             QMessageBox.warning(self, "No Session Folder", "No session folder found. Start YOLO processing first.")
             return
-
-        frames_path = self.current_session_folder
-        video_path = os.path.join(frames_path, "timelapse.mp4")
-        FPS = 15
-
-        images = [img for img in os.listdir(frames_path) if img.endswith(".jpg")]
-        images = natsorted(images)
-
-        if not images:
-            QMessageBox.warning(self, "No Images", "No images found in the session folder to create a timelapse.")
+        if self.timelapse_thread is not None and self.timelapse_thread.isRunning():
             return
 
-        first_frame = cv2.imread(os.path.join(frames_path, images[0]))
-        if first_frame is None:
-            QMessageBox.warning(self, "Error", "Could not read the first image.")
+        self.timelapse_button.setEnabled(False)
+        self.status_label.setText("Status: Creating timelapse...")
+        self.timelapse_thread = TimelapseThread(self.session_folders or [self.current_session_folder])
+        self.timelapse_thread.progress_signal.connect(self.timelapse_progress)
+        self.timelapse_thread.finished_signal.connect(self.timelapses_finished)
+        self.timelapse_thread.failed_signal.connect(self.timelapse_failed)
+        self.timelapse_thread.start()
+
+    def timelapse_progress(self, done, total):
+        self.status_label.setText(f"Status: Creating timelapse... {done}/{total}")
+
+    def timelapse_finished(self, video_path):
+        self.timelapse_button.setEnabled(True)
+        self.status_label.setText(f"Video saved in Output Folder as: {os.path.basename(video_path)}")
+
+    def timelapses_finished(self, video_paths):
+        self.timelapse_button.setEnabled(True)
+        if len(video_paths) == 1:
+            self.timelapse_finished(video_paths[0])
             return
+        folders = ", ".join(os.path.basename(os.path.dirname(path)) for path in video_paths)
+        self.status_label.setText(f"{len(video_paths)} videos saved in: {folders}")
 
-        h, w, _  = first_frame.shape
-        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-        out = cv2.VideoWriter(video_path, fourcc, FPS, (w, h))
-
-        for image in images:
-            frame = cv2.imread(os.path.join(frames_path, image))
-            if frame is None:
-                print(f"Warning: Skipping unreadable image {image}")
-                continue
-            out.write(frame)
-
-        out.release()
-        self.status_label.setText(f"Video saved in Output Folder as: timelapse.mp4")
+    def timelapse_failed(self, message):
+        self.timelapse_button.setEnabled(True)
+        self.status_label.setText("Status:")
+        QMessageBox.warning(self, "Timelapse Failed", message)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
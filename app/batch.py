@@ -0,0 +1,412 @@
+"""Headless batch processing of recorded prints.
+
+Usage:
+    python batch.py <folder|glob> [<folder|glob> ...] -o <output folder> [-j <workers>] [--batch-size <k>]
+    python batch.py <video> --compare-batch-sizes 1 4 8
+    python batch.py <video> --compare-backends torch onnx openvino
+    python batch.py <folder> -o <output folder> --resume
+    python batch.py <long video> -o <output folder> --split 4
+
+Every video gets its own session folder inside the output folder. The model is
+loaded once per worker process, not once per video. The detections are cached as a
+trace that replay.py can re-evaluate without the model.
+
+Every session folder gets a checkpoint. With --resume, a video whose last run was
+stopped or crashed continues in its old session folder from the checkpoint instead
+of starting over. --split processes one long video as several frame ranges at once
+and decides on the photos afterwards, over the traces of all ranges in order.
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from bestframe import BestFrameSelector
+from models import BACKENDS, WEIGHTS_PATH, get_model
+from checkpoint import Checkpoint, find_resumable, video_settings
+from motion import MAX_SKIPS, MotionGate
+from preprocess import FramePreprocessor
+from policies import POLICIES, StillnessPolicy, evaluate, make_policy
+from processing import detect_captures, process_video
+from replay import DetectionTrace, extract_frames, save_trace, trace_path
+from sampling import SAMPLE_INTERVAL, FrameSampler
+from writer import FORMATS, QUALITY
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv")
+
+_model = None
+
+#---------------------------------------------------------------#
+# Input discovery
+#---------------------------------------------------------------#
+def find_videos(inputs):
+    """Expands folders and glob patterns into a sorted list of video files."""
+    videos = []
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = [os.path.join(item, name) for name in os.listdir(item)]
+        else:
+            candidates = glob.glob(item)
+        videos.extend(path for path in candidates
+                      if os.path.isfile(path) and path.lower().endswith(VIDEO_EXTENSIONS))
+    return sorted(set(videos))
+
+
+def session_folder_for(video_path, output_root):
+    """Returns a session folder name that is unique inside output_root."""
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    folder = os.path.join(output_root, f"session_{stem}")
+    suffix = 1
+    while os.path.exists(folder):
+        suffix += 1
+        folder = os.path.join(output_root, f"session_{stem}_{suffix}")
+    return folder
+
+
+def split_ranges(frames, parts):
+    """Splits a video of `frames` frames into up to `parts` consecutive (start, end) frame ranges.
+
+    The last range is open-ended, frame counts from the container aren't always exact.
+    """
+    if frames <= 0 or parts <= 1:
+        return [(0, None)]
+    bounds = [round(i * frames / parts) for i in range(parts)]
+    ranges = [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+    return ranges + [(bounds[-1], None)]
+
+
+def frame_count(video_path):
+    cap = cv2.VideoCapture(video_path)
+    try:
+        return int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+    finally:
+        cap.release()
+
+#---------------------------------------------------------------#
+# Worker
+#---------------------------------------------------------------#
+def _init_worker(weights_path, threads, backend, int8):
+    """Loads the model once per worker process."""
+    global _model
+    import torch
+
+    # Keep workers from oversubscribing the CPU
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(1)
+    _model = get_model(weights_path, backend=backend, int8=int8)
+
+
+def _process_one(job):
+    video_path, session_folder, options, trace_settings = job
+    try:
+        trace = DetectionTrace()
+        # every video starts with a fresh policy
+        options = dict(options, policy=make_policy(options["policy"]))
+        if options.pop("best_frame"):
+            options["selector"] = BestFrameSelector(options["policy"])
+        stats = process_video(video_path, session_folder, _model, verbose=False, trace=trace, **options)
+        # a resumed run only traced the frames after its checkpoint
+        if not stats["resumed_from"]:
+            trace.save(trace_path(video_path, interval=options["interval"], preprocessor=options["preprocessor"],
+                                  motion_gate=options["motion_gate"], **trace_settings))
+        return video_path, session_folder, stats, None
+    except Exception as e:
+        return video_path, session_folder, None, str(e)
+
+
+def _trace_range(job):
+    """Records the trace of one frame range, the photos of the range itself are thrown away."""
+    video_path, start_frame, end_frame, options = job
+    try:
+        trace = DetectionTrace()
+        with tempfile.TemporaryDirectory() as scratch:
+            stats = process_video(video_path, scratch, _model, verbose=False, trace=trace, start_frame=start_frame,
+                                  end_frame=end_frame, **options)
+        return video_path, start_frame, trace.array(), stats, None
+    except Exception as e:
+        return video_path, start_frame, None, None, str(e)
+
+#---------------------------------------------------------------#
+# Entry point
+#---------------------------------------------------------------#
+def run_batch(inputs, output_root, workers=None, weights_path=WEIGHTS_PATH, interval=SAMPLE_INTERVAL,
+              batch_size=1, preprocessor=None, backend="torch", int8=False, motion_gate=None, policy="stillness",
+              best_frame=False, writer_options=None, resume=False):
+    """Processes all videos matching inputs across a process pool, returns a list of per-file stats.
+
+    With resume, a video with an unfinished checkpoint in output_root continues in that session folder.
+    """
+    videos = find_videos(inputs)
+    if not videos:
+        print("⚠️ No videos found.")
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(videos))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    options = {"interval": interval, "batch_size": batch_size, "preprocessor": preprocessor,
+               "motion_gate": motion_gate, "policy": policy, "best_frame": best_frame,
+               "writer_options": writer_options}
+    trace_settings = {"weights_path": weights_path, "backend": backend, "int8": int8}
+    jobs = []
+    for video_path in videos:
+        settings = video_settings(video_path, interval, policy, best_frame, preprocessor, motion_gate)
+        session_folder = find_resumable(output_root, settings) if resume else None
+        if session_folder is not None:
+            print(f"⏩ {os.path.basename(video_path)}: resuming in {session_folder}")
+        else:
+            session_folder = session_folder_for(video_path, output_root)
+            os.makedirs(session_folder)
+        jobs.append((video_path, session_folder, dict(options, checkpoint=Checkpoint(session_folder, settings)),
+                     trace_settings))
+
+    print(f"🎥 Processing {len(videos)} videos with {workers} workers")
+
+    report = []
+    start = time.perf_counter()
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(weights_path, threads, backend, int8)) as pool:
+        for video_path, session_folder, stats, error in pool.imap_unordered(_process_one, jobs):
+            name = os.path.basename(video_path)
+            if error is not None:
+                print(f"❌ {name}: {error}")
+                continue
+            fps = stats["frames"] / stats["seconds"] if stats["seconds"] else 0.0
+            print(f"✅ {name}: {stats['frames']} frames in {stats['seconds']:.1f}s "
+                  f"({fps:.1f} fps), {stats['inferred']} inferred, {stats['skipped']} skipped, "
+                  f"{stats['captures']} photos -> {session_folder}")
+            report.append(dict(stats, video=video_path, session_folder=session_folder, fps=fps))
+    elapsed = time.perf_counter() - start
+
+    total_frames = sum(item["frames"] for item in report)
+    total_fps = total_frames / elapsed if elapsed else 0.0
+    print(f"📊 {len(report)}/{len(videos)} videos, {total_frames} frames in {elapsed:.1f}s "
+          f"({total_fps:.1f} fps aggregate)")
+    return report
+
+
+def run_split(inputs, output_root, parts, workers=None, weights_path=WEIGHTS_PATH, interval=SAMPLE_INTERVAL,
+              batch_size=1, preprocessor=None, backend="torch", int8=False, policy="stillness", writer_options=None):
+    """Processes every video as `parts` frame ranges across a process pool, returns a list of per-file stats.
+
+    The workers only record detection traces. Once all ranges of a video are done, the
+    traces are joined in frame order and the policy decides on the whole trace, so its
+    state carries over the range boundaries and the photos are the same as those of one
+    sequential run. Only those frames are then read again and saved, with writer_options.
+    There is no motion gate, it would start over in every range and skip other frames
+    than a sequential run.
+    """
+    videos = find_videos(inputs)
+    if not videos:
+        print("⚠️ No videos found.")
+        return []
+
+    jobs = []
+    options = {"interval": interval, "batch_size": batch_size, "preprocessor": preprocessor}
+    for video_path in videos:
+        jobs.extend((video_path, start_frame, end_frame, options)
+                    for start_frame, end_frame in split_ranges(frame_count(video_path), parts))
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    print(f"🎥 Processing {len(videos)} videos as {len(jobs)} ranges with {workers} workers")
+
+    ranges = {video_path: [] for video_path in videos}
+    failed = set()
+    start = time.perf_counter()
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(weights_path, threads, backend, int8)) as pool:
+        for video_path, start_frame, trace, stats, error in pool.imap_unordered(_trace_range, jobs):
+            if error is not None:
+                print(f"❌ {os.path.basename(video_path)} from frame {start_frame}: {error}")
+                failed.add(video_path)
+                continue
+            ranges[video_path].append((start_frame, trace, stats))
+
+    report = []
+    for video_path in videos:
+        if video_path in failed:
+            continue
+        parts_done = sorted(ranges[video_path], key=lambda item: item[0])
+        trace = np.concatenate([trace for _, trace, _ in parts_done])
+        captures = evaluate(make_policy(policy), trace)
+        session_folder = session_folder_for(video_path, output_root)
+        saved = extract_frames(video_path, captures, session_folder, writer_options)
+        save_trace(trace_path(video_path, weights_path, interval, preprocessor, backend=backend, int8=int8), trace)
+
+        stats = {key: sum(item[2][key] for item in parts_done) for key in ("sampled", "inferred", "skipped")}
+        stats.update(frames=max(item[2]["frames"] for item in parts_done), captures=saved,
+                     seconds=time.perf_counter() - start)
+        fps = stats["frames"] / stats["seconds"] if stats["seconds"] else 0.0
+        print(f"✅ {os.path.basename(video_path)}: {stats['frames']} frames in {len(parts_done)} ranges, "
+              f"{stats['seconds']:.1f}s ({fps:.1f} fps), {saved} photos -> {session_folder}")
+        report.append(dict(stats, video=video_path, session_folder=session_folder, fps=fps))
+    return report
+
+
+def compare_batch_sizes(video_path, batch_sizes, weights_path=WEIGHTS_PATH, interval=SAMPLE_INTERVAL,
+                        preprocessor=None, backend="torch", int8=False):
+    """Processes one video in-process at every batch size and prints the inference throughput."""
+    model = get_model(weights_path, backend=backend, int8=int8)
+    report = []
+    for batch_size in batch_sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            stats = process_video(video_path, folder, model, verbose=False, interval=interval,
+                                  batch_size=batch_size, preprocessor=preprocessor)
+        rate = stats["inferred"] / stats["seconds"] if stats["seconds"] else 0.0
+        fps = stats["frames"] / stats["seconds"] if stats["seconds"] else 0.0
+        print(f"📊 batch size {batch_size}: {stats['inferred']} frames inferred in {stats['seconds']:.1f}s "
+              f"({rate:.1f} inferences/s, {fps:.1f} video fps), {stats['captures']} photos")
+        report.append(dict(stats, batch_size=batch_size, inferences_per_second=rate, fps=fps))
+    return report
+
+
+def compare_backends(video_path, backends, weights_path=WEIGHTS_PATH, interval=SAMPLE_INTERVAL,
+                     preprocessor=None, int8=False):
+    """Runs every backend on the same sampled frames and prints latency and agreement with the torch model.
+
+    The .pt model is always the reference, also when torch isn't in backends. Agreement is measured
+    as the share of frames with the same number of boxes, the mean x-offset between matching boxes,
+    and the overlap of the frames the capture rule would save.
+    """
+    preprocessor = preprocessor or FramePreprocessor()
+    reference = "torch"
+    backends = list(backends) if reference in backends else [reference] + list(backends)
+    models = {backend: get_model(weights_path, backend=backend, int8=int8 and backend == "onnx")
+              for backend in backends}
+    seconds = {backend: 0.0 for backend in backends}
+    positions = {backend: [] for backend in backends}
+    captures = {backend: set() for backend in backends}
+    states = {backend: StillnessPolicy() for backend in backends}
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video file: {video_path}")
+    try:
+        for frame_count, frame in FrameSampler(cap, interval=interval):
+            small = preprocessor(frame)
+            for backend, model in models.items():
+                start = time.perf_counter()
+                results = model.predict(small, device="cpu", verbose=False, **preprocessor.predict_kwargs())
+                seconds[backend] += time.perf_counter() - start
+
+                positions[backend].append(sorted(preprocessor.normalize(box.xywh[0].tolist(), frame.shape)[0]
+                                                 for box in results[0].boxes))
+                captures[backend].update(capture.frame_count for capture in
+                                         detect_captures(states[backend], [(frame_count, frame)], results,
+                                                         preprocessor))
+    finally:
+        cap.release()
+
+    frames = len(positions[reference])
+    report = []
+    for backend in backends:
+        same_count = 0
+        offsets = []
+        for xs, ref_xs in zip(positions[backend], positions[reference]):
+            if len(xs) == len(ref_xs):
+                same_count += 1
+                offsets.extend(abs(x - ref_x) for x, ref_x in zip(xs, ref_xs))
+        union = captures[backend] | captures[reference]
+        item = {
+            "backend": backend,
+            "frames": frames,
+            "latency_ms": seconds[backend] / frames * 1000 if frames else 0.0,
+            "box_count_agreement": same_count / frames if frames else 1.0,
+            "mean_x_offset": sum(offsets) / len(offsets) if offsets else 0.0,
+            "capture_agreement": len(captures[backend] & captures[reference]) / len(union) if union else 1.0,
+            "captures": len(captures[backend]),
+        }
+        print(f"📊 {backend}: {item['latency_ms']:.1f} ms/frame, "
+              f"{item['box_count_agreement']:.1%} same box count, "
+              f"{item['mean_x_offset']:.4f} mean x offset, "
+              f"{item['capture_agreement']:.1%} same photos as {reference} (.pt) ({item['captures']} photos)")
+        report.append(item)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Process a folder of print videos without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="video folders or glob patterns")
+    parser.add_argument("-o", "--output", help="folder for the session folders")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--weights", default=WEIGHTS_PATH, help="path to the YOLO weights")
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL,
+                        help="seconds of video between two inferred frames")
+    parser.add_argument("--batch-size", type=int, default=1, help="sampled frames per model call")
+    parser.add_argument("--roi", type=float, nargs=4, metavar=("X0", "Y0", "X1", "Y1"),
+                        help="only run the model on this normalized region of the frame")
+    parser.add_argument("--imgsz", type=int, default=None,
+                        help="longest side of the image given to the model")
+    parser.add_argument("--motion-threshold", type=float, default=None,
+                        help="skip the model while less than this share of the pixels changes (e.g. 0.005)")
+    parser.add_argument("--motion-max-skips", type=int, default=MAX_SKIPS,
+                        help="run the model at least once per this many unchanged frames")
+    parser.add_argument("--policy", choices=list(POLICIES), default="stillness",
+                        help="when to take a photo (see policies.py)")
+    parser.add_argument("--best-frame", action="store_true",
+                        help="save the sharpest frame while the head is parked instead of the first")
+    parser.add_argument("--format", choices=list(FORMATS), default="jpg", help="photo format")
+    parser.add_argument("--quality", type=int, default=QUALITY, help="JPEG/WebP quality (1-100)")
+    parser.add_argument("--spill-frames", type=int, default=0,
+                        help="raw frames a memory-mapped spill file holds when the disk falls behind")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue videos whose last run was stopped where its checkpoint left off")
+    parser.add_argument("--split", type=int, default=1, metavar="N",
+                        help="process every video as N frame ranges in parallel")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch", help="inference backend")
+    parser.add_argument("--int8", action="store_true", help="use an INT8 quantized model (onnx backend)")
+    parser.add_argument("--compare-backends", choices=BACKENDS, nargs="+", metavar="BACKEND",
+                        help="only report latency and agreement of these backends on the first video")
+    parser.add_argument("--compare-batch-sizes", type=int, nargs="+", metavar="K",
+                        help="only report throughput of the first video at these batch sizes")
+    args = parser.parse_args(argv)
+    preprocessor = FramePreprocessor(roi=args.roi, max_size=args.imgsz)
+    motion_gate = None
+    if args.motion_threshold is not None:
+        motion_gate = MotionGate(threshold=args.motion_threshold, max_skips=args.motion_max_skips)
+
+    if args.compare_batch_sizes or args.compare_backends:
+        videos = find_videos(args.inputs)
+        if not videos:
+            print("⚠️ No videos found.")
+            return 1
+        if args.compare_backends:
+            compare_backends(videos[0], args.compare_backends, weights_path=args.weights,
+                             interval=args.interval, preprocessor=preprocessor, int8=args.int8)
+        if args.compare_batch_sizes:
+            compare_batch_sizes(videos[0], args.compare_batch_sizes, weights_path=args.weights,
+                                interval=args.interval, preprocessor=preprocessor, backend=args.backend,
+                                int8=args.int8)
+        return 0
+
+    if not args.output:
+        parser.error("the following arguments are required: -o/--output")
+    os.makedirs(args.output, exist_ok=True)
+    writer_options = {"fmt": args.format, "quality": args.quality, "spill_frames": args.spill_frames}
+    if args.split > 1:
+        for flag, used in (("--best-frame", args.best_frame), ("--resume", args.resume),
+                           ("--motion-threshold", motion_gate is not None)):
+            if used:
+                parser.error(f"{flag} can't be combined with --split")
+        report = run_split(args.inputs, args.output, args.split, workers=args.workers, weights_path=args.weights,
+                           interval=args.interval, batch_size=args.batch_size, preprocessor=preprocessor,
+                           backend=args.backend, int8=args.int8, policy=args.policy, writer_options=writer_options)
+        return 0 if report else 1
+    report = run_batch(args.inputs, args.output, workers=args.workers, weights_path=args.weights,
+                       interval=args.interval, batch_size=args.batch_size, preprocessor=preprocessor,
+                       backend=args.backend, int8=args.int8, motion_gate=motion_gate, policy=args.policy,
+                       best_frame=args.best_frame,
+                       writer_options=writer_options, resume=args.resume)
+    return 0 if report else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Benchmark of the video processing path, with a synthetic printer video generator.
+
+Usage:
+    python benchmark.py [<video>] [--backend torch onnx] [--batch-size 1 4] [-o results.json]
+    python benchmark.py --generate synthetic.mp4 [--seconds 120]
+
+Without a video a synthetic print is generated: a static bed with a part that grows
+every layer and a printhead that crosses the bed and parks at the left edge at the
+end of each layer. Every backend and batch size runs the same video end to end
+(sampling, inference, capture decision, writing photos) and the time spent per stage
+is written as JSON, so results can be compared across releases and backends. The
+synthetic printhead is only a rectangle, so it measures speed, not detection quality.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+from models import BACKENDS, WEIGHTS_PATH, get_model
+from motion import MAX_SKIPS, MotionGate
+from preprocess import FramePreprocessor
+from processing import process_video
+from sampling import SAMPLE_INTERVAL
+from updater import current_version
+
+SYNTHETIC_SECONDS = 120
+SYNTHETIC_FPS = 30
+SYNTHETIC_SIZE = (1280, 720)
+LAYER_SECONDS = 8.0   # one layer of the synthetic print, including the park
+PARK_SECONDS = 1.5    # how long the printhead rests at the parking position
+
+#---------------------------------------------------------------#
+# Synthetic video
+#---------------------------------------------------------------#
+def make_synthetic_video(path, seconds=SYNTHETIC_SECONDS, fps=SYNTHETIC_FPS, size=SYNTHETIC_SIZE, seed=0):
+    """Writes a synthetic print recording to path and returns the frame indices where the head parks."""
+    w, h = size
+    rng = np.random.default_rng(seed)
+    # a textured bed, so compression and the motion gate see something like a real scene
+    bed = np.clip(rng.normal(90, 12, (h, w, 3)), 0, 255).astype(np.uint8)
+    bed = cv2.GaussianBlur(bed, (5, 5), 0)
+    for x in range(0, w, w // 16):
+        cv2.line(bed, (x, h // 2), (x, h), (70, 70, 70), 1)
+
+    head_w, head_h = w // 10, h // 6
+    park_x, head_y = w // 40, h // 4
+    part = (w // 2 - w // 10, w // 2 + w // 10)
+    layer_frames = int(LAYER_SECONDS * fps)
+    park_frames = int(PARK_SECONDS * fps)
+    frames = int(seconds * fps)
+
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    if not out.isOpened():
+        raise IOError(f"Could not open video writer for {path}")
+    parks = []
+    try:
+        for i in range(frames):
+            layer, t = divmod(i, layer_frames)
+            frame = bed.copy()
+            top = h - 40 - 3 * layer
+            cv2.rectangle(frame, (part[0], max(top, h // 2)), (part[1], h - 40), (40, 140, 220), -1)
+
+            print_frames = layer_frames - park_frames
+            if t < print_frames:
+                # sweep back and forth over the part while printing
+                phase = (t / print_frames) * 4 % 2
+                x = int(part[0] - head_w + (phase if phase < 1 else 2 - phase) * (part[1] - part[0] + head_w))
+            else:
+                x = park_x
+                if t == print_frames:
+                    parks.append(i)
+            cv2.rectangle(frame, (x, head_y), (x + head_w, head_y + head_h), (30, 30, 30), -1)
+            cv2.rectangle(frame, (x + head_w // 3, head_y + head_h), (x + 2 * head_w // 3, head_y + head_h + 12),
+                          (200, 200, 200), -1)
+            out.write(frame)
+    finally:
+        out.release()
+    return parks
+
+#---------------------------------------------------------------#
+# Benchmark
+#---------------------------------------------------------------#
+def run_benchmark(video_path, backends=("torch",), batch_sizes=(1,), weights_path=WEIGHTS_PATH,
+                  interval=SAMPLE_INTERVAL, preprocessor=None, motion_threshold=None, int8=False):
+    """Processes video_path once per backend and batch size, returns one result dict per run."""
+    results = []
+    for backend in backends:
+        model = get_model(weights_path, backend=backend, int8=int8 and backend == "onnx")
+        for batch_size in batch_sizes:
+            motion_gate = None
+            if motion_threshold is not None:
+                motion_gate = MotionGate(threshold=motion_threshold, max_skips=MAX_SKIPS)
+            with tempfile.TemporaryDirectory() as folder:
+                stats = process_video(video_path, folder, model, verbose=False, interval=interval,
+                                      batch_size=batch_size, preprocessor=preprocessor, motion_gate=motion_gate)
+            fps = stats["frames"] / stats["seconds"] if stats["seconds"] else 0.0
+            print(f"📊 {backend}, batch size {batch_size}: {stats['frames']} frames in {stats['seconds']:.1f}s "
+                  f"({fps:.1f} fps), {stats['captures']} photos")
+            for name, stage in stats["stages"].items():
+                print(f"   {name}: {stage['avg_ms']:.1f} ms avg, {stage['total_ms'] / 1000:.1f}s total")
+            results.append(dict(stats, backend=backend, batch_size=batch_size, fps=fps))
+    return results
+
+
+def video_info(video_path):
+    cap = cv2.VideoCapture(video_path)
+    try:
+        return {
+            "path": os.path.abspath(video_path),
+            "frames": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+            "fps": cap.get(cv2.CAP_PROP_FPS),
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        }
+    finally:
+        cap.release()
+
+
+def environment():
+    return {
+        "version": current_version(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the video processing path stage by stage.")
+    parser.add_argument("video", nargs="?", help="video to process, a synthetic print is generated without one")
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file")
+    parser.add_argument("--generate", metavar="PATH", help="only write a synthetic print video to PATH")
+    parser.add_argument("--seconds", type=float, default=SYNTHETIC_SECONDS, help="length of the synthetic video")
+    parser.add_argument("--size", type=int, nargs=2, default=SYNTHETIC_SIZE, metavar=("WIDTH", "HEIGHT"),
+                        help="resolution of the synthetic video")
+    parser.add_argument("--weights", default=WEIGHTS_PATH, help="path to the YOLO weights")
+    parser.add_argument("--backend", choices=BACKENDS, nargs="+", default=["torch"], help="inference backends")
+    parser.add_argument("--int8", action="store_true", help="use an INT8 quantized model (onnx backend)")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1], help="sampled frames per model call")
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL,
+                        help="seconds of video between two inferred frames")
+    parser.add_argument("--roi", type=float, nargs=4, metavar=("X0", "Y0", "X1", "Y1"),
+                        help="only run the model on this normalized region of the frame")
+    parser.add_argument("--imgsz", type=int, default=None, help="longest side of the image given to the model")
+    parser.add_argument("--motion-threshold", type=float, default=None,
+                        help="skip the model while less than this share of the pixels changes")
+    args = parser.parse_args(argv)
+
+    if args.generate:
+        parks = make_synthetic_video(args.generate, seconds=args.seconds, size=tuple(args.size))
+        print(f"✅ {args.generate}: {args.seconds:g}s synthetic print, the head parks {len(parks)} times")
+        return 0
+
+    preprocessor = FramePreprocessor(roi=args.roi, max_size=args.imgsz)
+    with tempfile.TemporaryDirectory() as scratch:
+        video_path = args.video
+        if video_path is None:
+            video_path = os.path.join(scratch, "synthetic.mp4")
+            print(f"🎬 Generating a {args.seconds:g}s synthetic print...")
+            make_synthetic_video(video_path, seconds=args.seconds, size=tuple(args.size))
+        info = dict(video_info(video_path), synthetic=args.video is None)
+        results = run_benchmark(video_path, args.backend, args.batch_size, weights_path=args.weights,
+                                interval=args.interval, preprocessor=preprocessor,
+                                motion_threshold=args.motion_threshold, int8=args.int8)
+
+    report = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "video": info,
+        "settings": {"interval": args.interval, "roi": args.roi, "imgsz": args.imgsz,
+                     "motion_threshold": args.motion_threshold, "int8": args.int8},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
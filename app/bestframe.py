@@ -0,0 +1,165 @@
+import cv2
+import numpy as np
+
+from policies import StillnessPolicy
+from writer import Capture
+
+BEST_FRAMES = 4                       # candidate frames kept per parked window
+PRINT_AREA = (0.25, 0.0, 0.75, 1.0)   # normalized x0, y0, x1, y1 of the part on the bed
+DISTANCE_WEIGHT = 4.0                 # sharpness gained per frame width between the head and the print area
+
+#---------------------------------------------------------------#
+# Best frame selection
+#---------------------------------------------------------------#
+class BestFrameSelector:
+    """Saves the best frame of every parked window instead of the first one.
+
+    A window opens when policy takes a photo and stays open while policy.holding is
+    True, e.g. while the head stays parked. The sampled frames of the window are
+    scored by sharpness (variance of the Laplacian) times a bonus for the distance
+    between the printhead box and print_area, and the best one is returned once the
+    window closes. Up to `size` candidates are kept in preallocated full-resolution
+    buffers, a new frame replaces the worst one when they are full, so nothing is
+    allocated per frame.
+    """
+
+    def __init__(self, policy, size=BEST_FRAMES, print_area=PRINT_AREA, distance_weight=DISTANCE_WEIGHT):
+        if size < 1:
+            raise ValueError(f"Need at least one candidate frame, got {size}")
+        self.policy = policy
+        self.size = size
+        self.print_area = print_area
+        self.distance_weight = distance_weight
+
+        self._frames = None       # (size, h, w, 3) candidate frames
+        self._gray = None
+        self._laplacian = None
+        self._scores = np.full(size, -np.inf)
+        self._frame_counts = [None] * size
+        self._boxes = [None] * size
+        self._count = 0
+        self._open = False
+        self._reference = None
+
+    @property
+    def in_window(self):
+        """True while a parked window is open and its best frame not returned yet."""
+        return self._open
+
+    def reset(self):
+        """Resets the policy and drops an open window."""
+        self.policy.reset()
+        self._clear()
+
+    def update(self, frame_count, frame, boxes):
+        """Feeds the boxes of a sampled frame to the policy, returns a Capture if a window closed, None otherwise."""
+        captured = self.policy.update(boxes)
+        capture = None
+        if self._open and (captured or not self.policy.holding):
+            capture = self.flush()
+        if captured:
+            self._open = True
+            self._reference = self.policy.box
+            self._offer(frame_count, frame, self.policy.box)
+        elif self._open:
+            self._offer(frame_count, frame, self._nearest(boxes))
+        return capture
+
+    def flush(self):
+        """Closes an open window and returns the Capture of its best frame, or None if no window is open."""
+        if not self._open or self._count == 0:
+            self._clear()
+            return None
+        best = int(np.argmax(self._scores[:self._count]))
+        box = self._boxes[best]
+        # the buffer is reused for the next window, the writer gets its own copy
+        frame = self._frames[best].copy()
+        if box is None:
+            capture = Capture(self._frame_counts[best], frame, None, None)
+        else:
+            capture = Capture(self._frame_counts[best], frame, tuple(box[:4].tolist()), float(box[4]))
+        self._clear()
+        return capture
+
+    #---------------------------------------------------------------#
+    # Scoring
+
+    def score(self, frame, box):
+        """Returns the score of a frame whose printhead box is box (None if the head isn't visible)."""
+        self._allocate(frame.shape)
+        return self._sharpness(frame) * (1.0 + self.distance_weight * self._distance(box))
+
+    def _offer(self, frame_count, frame, box):
+        score = self.score(frame, box)
+        if self._count < self.size:
+            slot = self._count
+            self._count += 1
+        else:
+            slot = int(np.argmin(self._scores))
+            if score <= self._scores[slot]:
+                return
+        np.copyto(self._frames[slot], frame)
+        self._scores[slot] = score
+        self._frame_counts[slot] = frame_count
+        self._boxes[slot] = box
+
+    def _sharpness(self, frame):
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        cv2.Laplacian(self._gray, cv2.CV_32F, dst=self._laplacian)
+        _, std = cv2.meanStdDev(self._laplacian)
+        return float(std[0, 0]) ** 2
+
+    def _distance(self, box):
+        """Normalized gap between the box and the print area, 0 if they overlap, 1 without a box."""
+        if box is None:
+            return 1.0
+        x, y, w, h = box[:4]
+        x0, y0, x1, y1 = self.print_area
+        dx = max(x0 - (x + w / 2), (x - w / 2) - x1, 0.0)
+        dy = max(y0 - (y + h / 2), (y - h / 2) - y1, 0.0)
+        return min(float(np.hypot(dx, dy)), 1.0)
+
+    def _nearest(self, boxes):
+        """Returns the box closest to the one that opened the window, the printhead of this frame."""
+        if len(boxes) == 0 or self._reference is None:
+            return None
+        return boxes[np.argmin(np.abs(boxes[:, 0] - self._reference[0]))]
+
+    def _allocate(self, shape):
+        if self._frames is not None and self._frames.shape[1:] == shape:
+            return
+        self._frames = np.empty((self.size,) + shape, dtype=np.uint8)
+        self._gray = np.empty(shape[:2], dtype=np.uint8)
+        self._laplacian = np.empty(shape[:2], dtype=np.float32)
+        # candidates of another resolution are gone, the window itself stays open
+        self._scores.fill(-np.inf)
+        self._count = 0
+
+    def _clear(self):
+        self._scores.fill(-np.inf)
+        self._frame_counts[:] = [None] * self.size
+        self._boxes[:] = [None] * self.size
+        self._count = 0
+        self._open = False
+        self._reference = None
+
+#---------------------------------------------------------------#
+# Session helpers
+#---------------------------------------------------------------#
+def session_policy(policy=None, selector=None):
+    """Returns the policy a session decides with: the selector's, else policy, else a StillnessPolicy."""
+    if selector is not None:
+        return selector.policy
+    return policy or StillnessPolicy()
+
+
+def finish_window(selector, sink):
+    """Saves the best frame of a window still open when the session ends, the head may still be parked.
+
+    Does nothing without a selector. sink is the session's CaptureSink.
+    """
+    if selector is None:
+        return
+    capture = selector.flush()
+    if capture is not None:
+        sink.save(capture)
@@ -0,0 +1,105 @@
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+import cv2
+
+MAX_INDEX = 10        # camera indices 0 .. MAX_INDEX - 1 are probed
+PROBE_TIMEOUT = 3.0   # seconds a single camera may take to open and deliver a frame
+CACHE_TTL = 300       # seconds a discovery result stays valid
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".dont-blink", "cameras.json")
+
+_cache = None
+_lock = threading.Lock()
+
+#---------------------------------------------------------------#
+# Camera discovery
+#---------------------------------------------------------------#
+def discover_cameras(max_index=MAX_INDEX, timeout=PROBE_TIMEOUT, refresh=False, cache_path=CACHE_PATH):
+    """Returns the sorted indices of the cameras that deliver frames.
+
+    All indices below max_index, plus the numbers of /dev/video* devices on Linux,
+    are probed at the same time, each on its own thread, so gaps in the numbering
+    don't end the search and a camera that hangs only costs `timeout` seconds once.
+    A result younger than CACHE_TTL is returned without probing unless refresh is set.
+    Results are also stored in cache_path, so the next start can show them right away.
+    """
+    global _cache
+    if not refresh:
+        cached = cached_cameras(cache_path=cache_path)
+        if cached is not None:
+            return cached
+
+    indices = sorted(set(range(max_index)) | set(_device_indices()))
+    found = {}
+    threads = [threading.Thread(target=_probe, args=(index, found), name=f"probe-camera-{index}", daemon=True)
+               for index in indices]
+    for thread in threads:
+        thread.start()
+    # one deadline for all probes, a camera that hangs is left behind
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+    cameras = sorted(index for index, ok in list(found.items()) if ok)
+
+    with _lock:
+        _cache = (time.time(), cameras)
+    _save_cache(cameras, cache_path)
+    return cameras
+
+
+def cached_cameras(max_age=CACHE_TTL, cache_path=CACHE_PATH):
+    """Returns the last discovery result if it is younger than max_age seconds, None otherwise."""
+    global _cache
+    with _lock:
+        cache = _cache
+    if cache is None:
+        cache = _load_cache(cache_path)
+        if cache is not None:
+            with _lock:
+                _cache = cache
+    if cache is None or time.time() - cache[0] > max_age:
+        return None
+    return list(cache[1])
+
+
+def _probe(index, found):
+    cap = cv2.VideoCapture(index)
+    try:
+        # some drivers open indices that never deliver a frame
+        found[index] = cap.isOpened() and cap.read()[0]
+    finally:
+        cap.release()
+
+
+def _device_indices():
+    if not sys.platform.startswith("linux"):
+        return []
+    indices = []
+    for path in glob.glob("/dev/video*"):
+        match = re.fullmatch(r"/dev/video(\d+)", path)
+        if match:
+            indices.append(int(match.group(1)))
+    return indices
+
+
+def _load_cache(cache_path):
+    try:
+        with open(cache_path, "r") as f:
+            data = json.load(f)
+        return float(data["time"]), [int(index) for index in data["cameras"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _save_cache(cameras, cache_path):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, "w") as f:
+            json.dump({"time": time.time(), "cameras": cameras}, f)
+    except OSError as e:
+        print(f"⚠️ Could not cache the camera list: {e}")
@@ -0,0 +1,102 @@
+import json
+import os
+import time
+
+CHECKPOINT_NAME = "checkpoint.json"
+CHECKPOINT_INTERVAL = 30.0   # seconds between two checkpoints of a running video
+
+#---------------------------------------------------------------#
+# Checkpoint
+#---------------------------------------------------------------#
+class Checkpoint:
+    """Position and capture state of a video processed into a session folder.
+
+    process_capture() saves one every `interval` seconds, after the photos decided so
+    far are written, and a last one when it ends. A run given the checkpoint of a
+    stopped or crashed run continues after its last saved frame with the capture
+    state it had there, instead of starting at frame 0. settings describe the run
+    (video, sample interval, policy, ROI, motion gate). A checkpoint saved with other settings is
+    ignored, as is one of a run that finished.
+    """
+
+    def __init__(self, session_folder, settings=None, interval=CHECKPOINT_INTERVAL):
+        self.path = os.path.join(session_folder, CHECKPOINT_NAME)
+        self.settings = settings or {}
+        self.interval = interval
+        self._last = time.monotonic()
+
+    def load(self):
+        """Returns the saved {"next_frame", "policy", "captures"} to resume from, or None."""
+        data = _read(self.path)
+        if data is None or data.get("finished") or data.get("settings") != self.settings:
+            return None
+        return data
+
+    def due(self):
+        return time.monotonic() - self._last >= self.interval
+
+    def save(self, next_frame, policy, captures, finished=False):
+        """Records that every sampled frame before next_frame is done, replacing the older checkpoint."""
+        data = {
+            "settings": self.settings,
+            "next_frame": int(next_frame),
+            "policy": policy.save_state(),
+            "captures": captures,
+            "finished": finished,
+            "time": time.time(),
+        }
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.path)
+        self._last = time.monotonic()
+
+
+def video_settings(video_path, interval, policy="stillness", best_frame=False, preprocessor=None, motion_gate=None):
+    """Returns the settings a checkpoint of video_path is only valid for, policy is the policy's name.
+
+    The ROI and size of a FramePreprocessor and the thresholds of a MotionGate change
+    which frames are captured, so a run with others doesn't continue the checkpoint.
+    """
+    settings = {
+        "video": os.path.abspath(video_path),
+        "size": os.path.getsize(video_path),
+        "interval": interval,
+        "policy": policy,
+        "best_frame": best_frame,
+        "roi": None,
+        "max_size": None,
+        "motion": None,
+    }
+    if preprocessor is not None:
+        settings.update(roi=list(preprocessor.roi) if preprocessor.roi else None, max_size=preprocessor.max_size)
+    if motion_gate is not None:
+        settings["motion"] = [motion_gate.threshold, motion_gate.pixel_threshold, motion_gate.size,
+                              motion_gate.max_skips]
+    return settings
+
+
+def find_resumable(output_folder, settings):
+    """Returns the session folder in output_folder with an unfinished checkpoint for settings, or None.
+
+    If there are several, the most recently saved one wins.
+    """
+    best = None
+    if not os.path.isdir(output_folder):
+        return None
+    for name in os.listdir(output_folder):
+        folder = os.path.join(output_folder, name)
+        data = _read(os.path.join(folder, CHECKPOINT_NAME))
+        if data is None or data.get("finished") or data.get("settings") != settings:
+            continue
+        if best is None or data.get("time", 0) > best[0]:
+            best = (data.get("time", 0), folder)
+    return best[1] if best else None
+
+
+def _read(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,76 @@
+import json
+import os
+import threading
+import time
+
+MANIFEST_NAME = "manifest.jsonl"
+
+#---------------------------------------------------------------#
+# Session manifest
+#---------------------------------------------------------------#
+class SessionManifest:
+    """Append-only index of the photos saved in a session folder.
+
+    Every saved photo adds one JSON line with its frame index, the time it was taken,
+    the normalized (x, y, w, h) printhead box that triggered it, the confidence of that
+    box and the file name relative to the session folder. Lines are flushed right away,
+    so a crashed session keeps everything up to its last photo. Entries may be added
+    from several threads.
+    """
+
+    def __init__(self, session_folder):
+        self.session_folder = session_folder
+        self.path = os.path.join(session_folder, MANIFEST_NAME)
+        self.entries = 0
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def add(self, frame_index, filename, box=None, conf=None, timestamp=None):
+        """Records a saved photo, filename is relative to the session folder."""
+        entry = {
+            "frame": int(frame_index),
+            "time": time.time() if timestamp is None else timestamp,
+            "box": None if box is None else [round(float(v), 6) for v in box],
+            "conf": None if conf is None else round(float(conf), 4),
+            "path": filename,
+        }
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.entries += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def has_manifest(session_folder):
+    return os.path.isfile(os.path.join(session_folder, MANIFEST_NAME))
+
+
+def read_manifest(session_folder):
+    """Returns the entries of a session's manifest ordered by frame index, or None without a manifest.
+
+    A line cut off by a crash is ignored. A frame saved twice, e.g. by a run resumed
+    from a checkpoint, is listed once with its latest entry.
+    """
+    path = os.path.join(session_folder, MANIFEST_NAME)
+    if not os.path.isfile(path):
+        return None
+    entries = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            entries[entry["frame"]] = entry
+    # photos are written by several threads, so lines may be slightly out of order
+    return sorted(entries.values(), key=lambda entry: entry["frame"])
@@ -0,0 +1,143 @@
+import bisect
+import http.server
+import os
+import threading
+
+# upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_HOST = "127.0.0.1"
+# set DONT_BLINK_METRICS_PORT to serve the metrics of a running camera session
+METRICS_PORT = int(os.environ.get("DONT_BLINK_METRICS_PORT", 0)) or None
+PREFIX = "dontblink"
+
+# stats keys that only ever grow, the other numbers are exported as gauges
+COUNTERS = ("frames", "sampled", "inferred", "skipped", "captures", "dropped")
+
+#---------------------------------------------------------------#
+# Stage timing
+#---------------------------------------------------------------#
+class StageStats:
+    """Counts how often a pipeline stage ran and how long it took.
+
+    Every duration is also sorted into a latency histogram with the given bucket bounds.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+            self.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+
+    def summary(self):
+        with self._lock:
+            avg = self.total / self.count if self.count else 0.0
+            return {"count": self.count, "avg_ms": avg * 1000, "max_ms": self.max * 1000,
+                    "total_ms": self.total * 1000}
+
+    def histogram(self):
+        """Returns [(upper bound, cumulative count)], the sum of all durations and the count."""
+        with self._lock:
+            cumulative = []
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), self.bucket_counts):
+                running += count
+                cumulative.append((bound, running))
+            return cumulative, self.total, self.count
+
+#---------------------------------------------------------------#
+# Prometheus endpoint
+#---------------------------------------------------------------#
+def prometheus_text(stats, stages, prefix=PREFIX):
+    """Renders a stats dict and a dict of StageStats in the Prometheus text format.
+
+    Numbers in stats named in COUNTERS become counters, other numbers gauges. A nested
+    dict of numbers becomes one gauge with its keys as label, e.g. the queue depths.
+    """
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            values = {k: v for k, v in value.items() if isinstance(v, (int, float))}
+            if not values:
+                continue
+            name = f"{prefix}_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines += [f'{name}{{{key[:-1] if key.endswith("s") else key}="{k}"}} {v}' for k, v in values.items()]
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if key in COUNTERS:
+                name = f"{prefix}_{key}_total"
+                lines.append(f"# TYPE {name} counter")
+            else:
+                name = f"{prefix}_{key}"
+                lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+
+    name = f"{prefix}_stage_seconds"
+    lines.append(f"# HELP {name} Time spent per processing stage.")
+    lines.append(f"# TYPE {name} histogram")
+    for stage_name, stage in stages.items():
+        cumulative, total, count = stage.histogram()
+        for bound, running in cumulative:
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{stage="{stage_name}",le="{le}"}} {running}')
+        lines.append(f'{name}_sum{{stage="{stage_name}"}} {total}')
+        lines.append(f'{name}_count{{stage="{stage_name}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves the metrics of a running session at http://host:port/metrics.
+
+    collect is called per request and returns (stats, stages) as taken by
+    prometheus_text, e.g. `lambda: (pipeline.stats(), pipeline.stages)`. Nothing runs
+    between requests, so the session isn't slowed down by an idle endpoint. Port 0
+    picks a free port, see `port` after starting.
+    """
+
+    def __init__(self, collect, port=METRICS_PORT, host=METRICS_HOST):
+        self.collect = collect
+        self.host = host
+        self.port = port or 0
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        collect = self.collect
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = prometheus_text(*collect()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        print(f"📈 Metrics at http://{self.host}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
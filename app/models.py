@@ -0,0 +1,119 @@
+import importlib.util
+import os
+import threading
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+WEIGHTS_PATH = os.path.join(BASE_DIR, "weights", "best.pt")
+
+BACKENDS = ("torch", "onnx", "openvino")
+_RUNTIMES = {"onnx": "onnxruntime", "openvino": "openvino"}
+
+_models = {}
+_lock = threading.Lock()
+
+#---------------------------------------------------------------#
+# Model registry
+#---------------------------------------------------------------#
+def get_model(weights_path=WEIGHTS_PATH, device="cpu", backend="torch", int8=False):
+    """Returns the shared YOLO model for weights_path, device and backend, loading it on first use.
+
+    The first call loads the weights and runs one dummy inference so the first real
+    frame doesn't pay for lazy initialization. Later calls return the cached model.
+    The onnx and openvino backends run an exported copy of the .pt weights and fall
+    back to PyTorch if the runtime is missing or the export fails.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    key = (os.path.abspath(weights_path), device, backend, int8)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        # another thread may have loaded it while we waited
+        model = _models.get(key)
+        if model is None:
+            model = _load(weights_path, device, backend, int8)
+            _models[key] = model
+    return model
+
+
+def is_loaded(weights_path=WEIGHTS_PATH, device="cpu", backend="torch", int8=False):
+    """Tells whether get_model would return without loading."""
+    return (os.path.abspath(weights_path), device, backend, int8) in _models
+
+
+def clear_models():
+    """Drops all cached models."""
+    with _lock:
+        _models.clear()
+
+
+def _load(weights_path, device, backend, int8):
+    if backend != "torch":
+        try:
+            return _warm_up(export_model(weights_path, backend, int8), device)
+        except Exception as e:
+            print(f"⚠️ Could not use the {backend} backend ({e}), falling back to PyTorch.")
+    return _warm_up(weights_path, device)
+
+
+def _warm_up(path, device):
+    from ultralytics import YOLO
+
+    model = YOLO(path, task="detect")
+    model.predict(np.zeros((64, 64, 3), dtype=np.uint8), device=device, verbose=False)
+    return model
+
+#---------------------------------------------------------------#
+# Export
+#---------------------------------------------------------------#
+def export_model(weights_path=WEIGHTS_PATH, backend="onnx", int8=False):
+    """Exports the .pt weights for backend and returns the path of the exported model.
+
+    The export is cached next to the weights and only redone when the weights are newer.
+    INT8 uses ONNX Runtime's dynamic quantization, so it is only available for onnx.
+    """
+    runtime = _RUNTIMES.get(backend)
+    if runtime is None:
+        raise ValueError(f"Backend '{backend}' has nothing to export")
+    if importlib.util.find_spec(runtime) is None:
+        raise ImportError(f"{runtime} is not installed")
+    if int8 and backend != "onnx":
+        raise ValueError("INT8 quantization is only available for the onnx backend")
+
+    stem = os.path.splitext(weights_path)[0]
+    if backend == "onnx":
+        target = stem + (".int8.onnx" if int8 else ".onnx")
+    else:
+        target = stem + "_openvino_model"
+    if _is_fresh(target, weights_path):
+        return target
+
+    from ultralytics import YOLO
+
+    print(f"📦 Exporting {os.path.basename(weights_path)} for {backend}...")
+    # dynamic axes so the exported model accepts batches and a reduced imgsz
+    exported = YOLO(weights_path).export(format=backend, dynamic=True)
+    if int8:
+        _quantize_onnx(exported, target)
+    return target
+
+
+def _is_fresh(target, weights_path):
+    return os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(weights_path)
+
+
+def _quantize_onnx(source, target):
+    import onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(source, target, weight_type=QuantType.QUInt8)
+
+    # keep the metadata (class names, stride, imgsz) ultralytics reads when loading the model
+    model = onnx.load(target)
+    del model.metadata_props[:]
+    model.metadata_props.extend(onnx.load(source).metadata_props)
+    onnx.save(model, target)
@@ -0,0 +1,64 @@
+import cv2
+
+MOTION_THRESHOLD = 0.005  # share of thumbnail pixels that must change to count as motion
+PIXEL_THRESHOLD = 25      # gray level difference (0-255) for a pixel to count as changed
+MOTION_SIZE = 64          # longest side of the thumbnails that are compared
+MAX_SKIPS = 20            # run the model at least every MAX_SKIPS + 1 sampled frames
+
+#---------------------------------------------------------------#
+# Motion gate
+#---------------------------------------------------------------#
+class MotionGate:
+    """Tells whether a frame changed enough since the last inference to run the model again.
+
+    Frames are compared as small grayscale thumbnails against the frame the model last
+    saw, so slow drift still adds up to a change. A frame counts as changed when more
+    than `threshold` of its pixels differ by more than `pixel_threshold` gray levels,
+    which catches a small moving printhead but ignores sensor noise. After max_skips
+    unchanged frames in a row the model runs anyway.
+    """
+
+    def __init__(self, threshold=MOTION_THRESHOLD, pixel_threshold=PIXEL_THRESHOLD, size=MOTION_SIZE,
+                 max_skips=MAX_SKIPS):
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.size = size
+        self.max_skips = max_skips
+        self.reference = None
+        self.skips = 0
+        self.checked = 0
+        self.skipped = 0
+
+    def changed(self, image):
+        """Returns True if the model should run on image, which then becomes the new reference."""
+        thumbnail = self._thumbnail(image)
+        self.checked += 1
+        if (self.reference is not None and self.reference.shape == thumbnail.shape
+                and self.skips < self.max_skips
+                and self._changed_share(thumbnail) <= self.threshold):
+            self.skips += 1
+            self.skipped += 1
+            return False
+
+        self.reference = thumbnail
+        self.skips = 0
+        return True
+
+    def reset(self):
+        """Forgets the reference, so the next frame always counts as changed."""
+        self.reference = None
+        self.skips = 0
+
+    def _changed_share(self, thumbnail):
+        diff = cv2.absdiff(thumbnail, self.reference)
+        return cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1]) / diff.size
+
+    def _thumbnail(self, image):
+        h, w = image.shape[:2]
+        scale = self.size / max(h, w)
+        if scale < 1:
+            image = cv2.resize(image, (max(1, round(w*scale)), max(1, round(h*scale))),
+                               interpolation=cv2.INTER_AREA)
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return image
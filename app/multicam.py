@@ -0,0 +1,322 @@
+"""Several cameras in one process, sharing one model.
+
+Usage:
+    python multicam.py <camera index|URL|video> [<camera index|URL|video> ...] -o <output folder>
+
+Every camera gets its own sampling thread and session folder. A single inference
+thread collects the newest sampled frame of every camera and runs them through the
+model in one batch, so adding a camera adds a batch slot rather than a model.
+Video files are played in real time and act like cameras, which is handy for trying
+a shelf setup without the printers. Network cameras (http:// MJPEG, rtsp://) are
+reconnected when their stream drops.
+"""
+import argparse
+import datetime
+import os
+import sys
+import threading
+import time
+
+from bestframe import finish_window, session_policy
+from manifest import SessionManifest
+from metrics import StageStats
+from preprocess import FramePreprocessor
+from processing import CaptureSink, Detector, detect_captures, predict
+from sampling import SAMPLE_INTERVAL, FrameSampler
+from stages import ThreadedStages
+from writer import FORMATS, QUALITY, PhotoWriter
+
+BATCH_WAIT = 0.05  # seconds the inference thread waits for other cameras to fill a batch
+
+#---------------------------------------------------------------#
+# Camera session
+#---------------------------------------------------------------#
+class CameraSession:
+    """One camera of a MultiCameraProcessor with its own session folder, motion gate and capture policy.
+
+    Only the newest sampled frame waits for inference. If the shared inference thread
+    hasn't picked it up by the time the next one is sampled, it is replaced and counted
+    in `dropped`.
+    """
+
+    def __init__(self, name, cap, session_folder, model, interval=SAMPLE_INTERVAL, preprocessor=None,
+                 motion_gate=None, policy=None, timelapse=None, selector=None, verbose=False):
+        self.name = name
+        self.cap = cap
+        self.session_folder = session_folder
+        self.interval = interval
+        self.preprocessor = preprocessor or FramePreprocessor()
+        self.detector = Detector(model, preprocessor=self.preprocessor, motion_gate=motion_gate, verbose=verbose)
+        self.selector = selector
+        self.policy = session_policy(policy, selector)
+        self.timelapse = timelapse
+        self.manifest = None
+        self.photos = None
+        self.sink = None
+        self.sampler = None
+
+        self.pending = None
+        self.finished = False
+        self.dropped = 0
+
+    def stats(self, seconds):
+        """Returns the counters of this camera, rates are per second of the run."""
+        sampled = self.sampler.decoded if self.sampler is not None else 0
+        return {
+            "camera": self.name,
+            "session_folder": self.session_folder,
+            "sampled": sampled,
+            "inferred": self.detector.inferred,
+            "skipped": self.detector.skipped,
+            "captures": self.sink.captures if self.sink is not None else 0,
+            "dropped": self.dropped,
+            "sampled_per_second": sampled / seconds if seconds else 0.0,
+            "inferred_per_second": self.detector.inferred / seconds if seconds else 0.0,
+            "writer": self.photos.stats() if self.photos is not None else None,
+        }
+
+#---------------------------------------------------------------#
+# Processor
+#---------------------------------------------------------------#
+class MultiCameraProcessor(ThreadedStages):
+    """Runs the capture rule on several cameras with one shared inference thread.
+
+    Each camera is sampled on its own thread, and sampled frames that didn't change are
+    answered from that camera's last result without running the model. The remaining
+    frames of all cameras are inferred with one predict call. After the first frame of
+    a batch arrives the inference thread waits up to batch_wait seconds for the other
+    cameras, so frames sampled at about the same time share a call. Every camera saves
+    its photos with its own PhotoWriter, writer_options (format, quality, ...) are
+    passed to all of them.
+    """
+
+    def __init__(self, model, batch_wait=BATCH_WAIT, should_stop=None, verbose=False, writer_options=None):
+        super().__init__(should_stop)
+        self.model = model
+        self.batch_wait = batch_wait
+        self.verbose = verbose
+        self.writer_options = writer_options or {}
+        self.sessions = []
+        self.batches = StageStats()
+
+        self._cond = threading.Condition()
+        self._start = None
+
+    def add_camera(self, name, cap, session_folder, **options):
+        """Adds a camera, options are passed to CameraSession. Returns the session."""
+        session = CameraSession(name, cap, session_folder, self.model, verbose=self.verbose, **options)
+        self.sessions.append(session)
+        return session
+
+    def run(self):
+        """Processes all cameras until every one of them ended or the processor is stopped."""
+        self._start = time.perf_counter()
+        threads = [threading.Thread(target=self._capture_loop, args=(session,), name=f"multicam-{session.name}",
+                                    daemon=True) for session in self.sessions]
+        threads.append(threading.Thread(target=self._inference_loop, name="multicam-inference", daemon=True))
+        for session in self.sessions:
+            session.manifest = SessionManifest(session.session_folder)
+            session.photos = PhotoWriter(session.session_folder, manifest=session.manifest,
+                                         **self.writer_options).start()
+            session.sink = CaptureSink(session.photos, session.timelapse)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        except BaseException:
+            # e.g. Ctrl+C: the stages must be done before their writers and manifests are closed
+            self._abort.set()
+            self.stop()
+            for thread in threads:
+                if thread.is_alive():
+                    thread.join()
+            raise
+        finally:
+            # close() waits for the writer threads, so every manifest entry is in before the manifest closes
+            for session in self.sessions:
+                try:
+                    session.photos.close()
+                except Exception as e:
+                    self._fail(e)
+                session.manifest.close()
+
+        if self._error is not None:
+            raise self._error
+        return self.stats()
+
+    def stop(self):
+        """Stops sampling, frames already sampled are still processed."""
+        self.should_stop = lambda: True
+        with self._cond:
+            self._cond.notify_all()
+
+    def stats(self):
+        """Returns the counters of every camera and the batch timing of the shared model."""
+        seconds = time.perf_counter() - self._start if self._start else 0.0
+        return {
+            "seconds": seconds,
+            "cameras": [session.stats(seconds) for session in self.sessions],
+            "batches": self.batches.summary(),
+        }
+
+    #---------------------------------------------------------------#
+    # Stages
+
+    def _capture_loop(self, session):
+        try:
+            session.sampler = FrameSampler(session.cap, interval=session.interval, should_stop=self._stopped)
+            for frame_count, frame in session.sampler:
+                small = session.preprocessor(frame)
+                with self._cond:
+                    if session.pending is not None:
+                        session.dropped += 1
+                    session.pending = (frame_count, frame, small)
+                    self._cond.notify_all()
+        except Exception as e:
+            self._fail(e)
+        finally:
+            with self._cond:
+                session.finished = True
+                self._cond.notify_all()
+
+    def _inference_loop(self):
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    break
+                self._infer(batch)
+            if not self._abort.is_set():
+                for session in self.sessions:
+                    finish_window(session.selector, session.sink)
+        except Exception as e:
+            self._fail(e)
+
+    def _next_batch(self):
+        """Waits for sampled frames and returns [(session, item)], or None once all cameras ended."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._abort.is_set() or any(s.pending is not None for s in self.sessions)
+                                or all(s.finished for s in self.sessions))
+            if self._abort.is_set():
+                return None
+            if not any(s.pending is not None for s in self.sessions):
+                return None
+            # give the other cameras a moment to join the batch
+            deadline = time.monotonic() + self.batch_wait
+            self._cond.wait_for(lambda: self._abort.is_set() or all(s.pending is not None or s.finished
+                                                                     for s in self.sessions),
+                                max(0.0, deadline - time.monotonic()))
+            batch = []
+            for session in self.sessions:
+                if session.pending is not None:
+                    batch.append((session, session.pending))
+                    session.pending = None
+            return batch
+
+    def _infer(self, batch):
+        # the motion gate of every camera decides whether its frame needs the model
+        todo = [(session, small) for session, (_, _, small) in batch if session.detector.plan([small])]
+        inferred = {}
+        # cameras with a different inference size need their own predict call
+        groups = {}
+        for session, small in todo:
+            groups.setdefault(tuple(session.preprocessor.predict_kwargs().items()), []).append((session, small))
+        for group in groups.values():
+            start = time.perf_counter()
+            results = predict(self.model, [small for _, small in group], group[0][0].preprocessor, self.verbose)
+            self.batches.add(time.perf_counter() - start)
+            for (session, _), result in zip(group, results):
+                inferred[id(session)] = [result]
+
+        for session, (frame_count, frame, _) in batch:
+            planned = [0] if id(session) in inferred else []
+            results = session.detector.results(1, planned, inferred.get(id(session), []))
+            for capture in detect_captures(session.policy, [(frame_count, frame)], results,
+                                           session.preprocessor, selector=session.selector):
+                session.sink.save(capture)
+
+    #---------------------------------------------------------------#
+    # Helpers
+
+    def _fail(self, error):
+        super()._fail(error)
+        # wake the inference thread, it waits on the condition rather than a queue
+        with self._cond:
+            self._cond.notify_all()
+
+
+def print_stats(stats):
+    """Prints one line per camera and the shared batch timing."""
+    for camera in stats["cameras"]:
+        print(f"📷 {camera['camera']}: {camera['sampled']} sampled ({camera['sampled_per_second']:.1f}/s), "
+              f"{camera['inferred']} inferred, {camera['skipped']} skipped without motion, "
+              f"{camera['captures']} photos, {camera['dropped']} frames dropped")
+    batches = stats["batches"]
+    print(f"   {batches['count']} model calls, {batches['avg_ms']:.1f} ms avg, {batches['max_ms']:.1f} ms max")
+
+#---------------------------------------------------------------#
+# Entry point
+#---------------------------------------------------------------#
+def main(argv=None):
+    from models import WEIGHTS_PATH, get_model
+    from motion import MAX_SKIPS, MotionGate
+    from sources import is_stream, open_source
+
+    parser = argparse.ArgumentParser(description="Watch several printers at once.")
+    parser.add_argument("cameras", nargs="+", help="camera indices, stream URLs (http://, rtsp://) or video files")
+    parser.add_argument("-o", "--output", required=True, help="folder for the session folders")
+    parser.add_argument("--weights", default=WEIGHTS_PATH, help="path to the YOLO weights")
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL,
+                        help="seconds between two inferred frames per camera")
+    parser.add_argument("--batch-wait", type=float, default=BATCH_WAIT,
+                        help="seconds to wait for other cameras before running a batch")
+    parser.add_argument("--format", choices=list(FORMATS), default="jpg", help="photo format")
+    parser.add_argument("--quality", type=int, default=QUALITY, help="JPEG/WebP quality (1-100)")
+    parser.add_argument("--motion-threshold", type=float, default=None,
+                        help="skip the model while less than this share of the pixels changes (e.g. 0.005)")
+    parser.add_argument("--motion-max-skips", type=int, default=MAX_SKIPS,
+                        help="run the model at least once per this many unchanged frames")
+    args = parser.parse_args(argv)
+
+    model = get_model(args.weights)
+    processor = MultiCameraProcessor(model, batch_wait=args.batch_wait,
+                                     writer_options={"fmt": args.format, "quality": args.quality})
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    sources = []
+    for index, camera in enumerate(args.cameras):
+        source = open_source(camera, realtime=True)
+        if camera.isdigit():
+            name = f"cam{camera}"
+        elif is_stream(camera):
+            name = f"stream{index}"
+        else:
+            name = os.path.splitext(os.path.basename(camera))[0]
+        if not source.cap.isOpened():
+            print(f"❌ Could not open {camera}")
+            continue
+        sources.append(source)
+        session_folder = os.path.join(args.output, f"session_{timestamp}_{name}")
+        os.makedirs(session_folder, exist_ok=True)
+        motion_gate = None
+        if args.motion_threshold is not None:
+            motion_gate = MotionGate(threshold=args.motion_threshold, max_skips=args.motion_max_skips)
+        processor.add_camera(name, source.subscribe(), session_folder, motion_gate=motion_gate)
+    if not sources:
+        return 1
+
+    print(f"🎥 Watching {len(sources)} cameras, press Ctrl+C to stop")
+    try:
+        stats = processor.run()
+    except KeyboardInterrupt:
+        processor.stop()
+        stats = processor.stats()
+    finally:
+        for source in sources:
+            source.stop()
+    print_stats(stats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
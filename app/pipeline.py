@@ -0,0 +1,164 @@
+import queue
+import threading
+import time
+
+from manifest import SessionManifest
+from metrics import StageStats
+from bestframe import finish_window, session_policy
+from preprocess import FramePreprocessor
+from processing import CaptureSink, Detector, detect_captures
+from sampling import SAMPLE_INTERVAL, FrameSampler
+from stages import ThreadedStages
+from writer import PhotoWriter
+
+QUEUE_SIZE = 4
+
+_DONE = object()
+
+#---------------------------------------------------------------#
+# Pipeline
+#---------------------------------------------------------------#
+class Pipeline(ThreadedStages):
+    """Runs frame sampling, inference and image writing on separate threads.
+
+    The stages are connected by bounded queues, photos are saved by a PhotoWriter that
+    gets writer_options (format, quality, workers, spill_frames, ...). For video files
+    a full queue blocks the stage in front of it. For live sources the capture thread
+    keeps reading and drops the oldest queued frame instead, so it never falls behind
+    the camera. Saved frames are recorded in the session manifest once written and also
+    added to timelapse (a TimelapseWriter) in capture order. When cap is a Subscription,
+    the latency of its FrameSource is reported as the source stage.
+    """
+
+    def __init__(self, cap, output_folder, model, interval=SAMPLE_INTERVAL, live=None,
+                 queue_size=QUEUE_SIZE, should_stop=None, verbose=False, preprocessor=None, motion_gate=None,
+                 timelapse=None, policy=None, selector=None, writer_options=None):
+        super().__init__(should_stop)
+        self.output_folder = output_folder
+        self.selector = selector
+        self.policy = session_policy(policy, selector)
+        self.preprocessor = preprocessor or FramePreprocessor()
+        self.detector = Detector(model, preprocessor=self.preprocessor, motion_gate=motion_gate, verbose=verbose)
+
+        self.sampler = FrameSampler(cap, interval=interval, should_stop=self._stopped)
+        self.live = not self.sampler.is_file if live is None else live
+
+        self.frames = queue.Queue(queue_size)
+        self.photos = PhotoWriter(output_folder, **(writer_options or {}))
+        self.stages = {name: StageStats() for name in ("decode", "queue", "inference", "decision")}
+        self.stages["write"] = self.photos.stages["write"]
+        self.source = getattr(cap, "source", None)
+        if self.source is not None:
+            self.stages["source"] = self.source.latency
+        self.sink = CaptureSink(self.photos, timelapse)
+        self.dropped = 0
+        self.lag = 0.0
+
+        self.manifest = None
+        self._start = None
+
+    def run(self):
+        """Starts all stages and blocks until the source ends or the pipeline is stopped."""
+        self._start = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._capture_loop, name="pipeline-capture", daemon=True),
+            threading.Thread(target=self._inference_loop, name="pipeline-inference", daemon=True),
+        ]
+        with SessionManifest(self.output_folder) as self.manifest:
+            self.photos.manifest = self.manifest
+            with self.photos:
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+        if self._error is not None:
+            raise self._error
+        return self.stats()
+
+    def stop(self):
+        """Stops reading new frames, frames already queued are still processed."""
+        self.should_stop = lambda: True
+
+    def stats(self):
+        """Returns counters, current queue depths, per-stage latency and the current lag.
+
+        lag_seconds is how long ago the newest decided frame was sampled, so it grows
+        when inference falls behind the camera.
+        """
+        return {
+            "frames": self.sampler.position,
+            "sampled": self.sampler.decoded,
+            "inferred": self.detector.inferred,
+            "skipped": self.detector.skipped,
+            "captures": self.sink.captures,
+            "dropped": self.dropped,
+            "seconds": time.perf_counter() - self._start if self._start else 0.0,
+            "lag_seconds": self.lag,
+            "queues": {"frames": self.frames.qsize(), "writes": self.photos.pending()},
+            "stages": {name: stage.summary() for name, stage in self.stages.items()},
+            "writer": self.photos.stats(),
+            "source": self.source.stats() if self.source is not None else None,
+        }
+
+    #---------------------------------------------------------------#
+    # Stages
+
+    def _capture_loop(self):
+        try:
+            start = time.perf_counter()
+            for frame_count, frame in self.sampler:
+                small = self.preprocessor(frame)
+                now = time.perf_counter()
+                self.stages["decode"].add(now - start)
+                if self.live:
+                    self._put_latest((frame_count, frame, small, now))
+                else:
+                    self._put(self.frames, (frame_count, frame, small, now))
+                start = time.perf_counter()
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self.frames, _DONE)
+
+    def _inference_loop(self):
+        try:
+            while True:
+                item = self._get(self.frames)
+                if item is None or item is _DONE:
+                    break
+                frame_count, frame, small, queued = item
+
+                start = time.perf_counter()
+                self.stages["queue"].add(start - queued)
+                results = self.detector.detect([small])
+                now = time.perf_counter()
+                self.stages["inference"].add(now - start)
+
+                captures = list(detect_captures(self.policy, [(frame_count, frame)], results, self.preprocessor,
+                                                selector=self.selector))
+                decided = time.perf_counter()
+                self.stages["decision"].add(decided - now)
+                self.lag = decided - queued
+                for capture in captures:
+                    self.sink.save(capture)
+            if not self._abort.is_set():
+                finish_window(self.selector, self.sink)
+        except Exception as e:
+            self._fail(e)
+
+    #---------------------------------------------------------------#
+    # Queue helpers
+
+    def _put_latest(self, item):
+        """Non-blocking put that makes room by dropping the oldest queued frame."""
+        while True:
+            try:
+                self.frames.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
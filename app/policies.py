@@ -0,0 +1,368 @@
+"""Capture policies: decide from the detections of a sampled frame whether to take a photo.
+
+Usage:
+    python policies.py <trace.npy> [<session folder>]
+
+Every policy gets the boxes of one sampled frame at a time as an (N, 5) array of
+normalized full-frame x, y, w, h, conf. N may be 0. Given a trace this prints how
+many photos every policy takes and how long a decision takes. Given the session
+folder the trace was recorded with, it also checks that the stillness policy picks
+exactly the photos in the session's manifest.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+WIGGLE_ROOM = 0.003
+MATCHES = 2             # still detections in a row before a photo is taken
+PARK_TOLERANCE = 0.01   # how close to the parking position counts as parked
+PROCESS_NOISE = 1e-4    # Kalman: how much the printhead speed may change between samples
+MEASUREMENT_NOISE = 1e-4
+EXIT_MISSES = 2         # Kalman: missed frames in a row predicted outside the frame before the head counts as gone
+
+SELECTIONS = ("each", "leftmost", "confident")
+
+#---------------------------------------------------------------#
+# Policies
+#---------------------------------------------------------------#
+class CapturePolicy:
+    """Base class of the capture policies.
+
+    update() takes the boxes of the next sampled frame and returns True if the frame
+    should be saved. box then holds the (x, y, w, h, conf) row that decided it, or None
+    if the photo was taken because nothing was detected. holding stays True for as
+    long as the condition that took the last photo still holds, e.g. while the head
+    stays parked.
+
+    save_state() returns what the policy remembers between frames as a JSON-friendly dict,
+    so a run can be checkpointed and continued later with load_state().
+    """
+    name = None
+    state_fields = ()
+
+    def __init__(self):
+        self.box = None
+
+    def reset(self):
+        self.box = None
+
+    def save_state(self):
+        state = {}
+        for field in self.state_fields:
+            value = getattr(self, field)
+            state[field] = value.tolist() if isinstance(value, (np.ndarray, np.generic)) else value
+        return state
+
+    def load_state(self, state):
+        self.reset()
+        for field in self.state_fields:
+            value = state[field]
+            setattr(self, field, np.array(value) if isinstance(value, list) else value)
+
+    @property
+    def holding(self):
+        return False
+
+    def update(self, boxes):
+        raise NotImplementedError
+
+
+class StillnessPolicy(CapturePolicy):
+    """Takes a photo when the printhead stops moving, the rule Dont-Blink always used.
+
+    A position within wiggle_room of the previous one counts as still. After `matches`
+    still positions in a row one photo is taken, the next only after the head moved
+    again. The reference position only moves left while the head moves, so a head
+    coming back from the right edge is caught at its leftmost point.
+
+    select decides which boxes of a frame feed the rule: "each" feeds every box in
+    detection order like before, "leftmost" only the leftmost box and "confident" only
+    the most confident one. Frames without a box leave the state alone.
+    """
+    name = "stillness"
+    state_fields = ("prev_x", "still")
+
+    def __init__(self, wiggle_room=WIGGLE_ROOM, matches=MATCHES, select="each"):
+        super().__init__()
+        if select not in SELECTIONS:
+            raise ValueError(f"Unknown box selection '{select}', expected one of {', '.join(SELECTIONS)}")
+        self.wiggle_room = wiggle_room
+        self.matches = matches
+        self.select = select
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self.prev_x = 1.0
+        self.still = 0
+
+    @property
+    def holding(self):
+        return self.still >= self.matches
+
+    def update(self, boxes):
+        self.box = None
+        capture = False
+        for row in _select(boxes, self.select):
+            x = row[0]
+            if abs(x - self.prev_x) < self.wiggle_room:
+                self.prev_x = x
+                self.still += 1
+                # the count keeps growing while the head stays, so each stop is captured once
+                if self.still == self.matches and not capture:
+                    capture = True
+                    self.box = row
+            else:
+                self.still = 0
+            self.prev_x = min(self.prev_x, x)
+        return capture
+
+    @staticmethod
+    def replay(xs, wiggle_rooms, matches):
+        """Runs the rule over positions for many parameter sets at once.
+
+        xs are the positions in the order they would be fed to update(). Returns a
+        boolean array with one row per parameter set and one column per position. The
+        positions are walked once and every step updates all parameter sets together,
+        so a grid of hundreds of sets costs little more than one.
+        """
+        wiggle_rooms = np.asarray(wiggle_rooms, dtype=np.float64)
+        matches = np.asarray(matches, dtype=np.int64)
+        if wiggle_rooms.shape != matches.shape:
+            raise ValueError("wiggle_rooms and matches need one value per parameter set")
+
+        prev_x = np.ones(len(wiggle_rooms))
+        still = np.zeros(len(wiggle_rooms), dtype=np.int64)
+        captures = np.zeros((len(wiggle_rooms), len(xs)), dtype=bool)
+        for i, x in enumerate(xs):
+            same = np.abs(x - prev_x) < wiggle_rooms
+            prev_x = np.where(same, x, prev_x)
+            still = np.where(same, still + 1, 0)
+            captures[:, i] = still == matches
+            np.minimum(prev_x, x, out=prev_x)
+        return captures
+
+
+class LeftmostParkPolicy(CapturePolicy):
+    """Takes a photo when the printhead rests at its parking position.
+
+    The parking position is park_x, or if that is None the leftmost position the head
+    was seen at so far. The leftmost box of a frame within `tolerance` of it for
+    `matches` frames in a row gives one photo, the next only after the head left the
+    parking position or the frame.
+    """
+    name = "leftmost-park"
+    state_fields = ("parking", "parked")
+
+    def __init__(self, park_x=None, tolerance=PARK_TOLERANCE, matches=MATCHES):
+        super().__init__()
+        self.park_x = park_x
+        self.tolerance = tolerance
+        self.matches = matches
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self.parking = self.park_x
+        self.parked = 0
+
+    @property
+    def holding(self):
+        return self.parked >= self.matches
+
+    def update(self, boxes):
+        self.box = None
+        if len(boxes) == 0:
+            self.parked = 0
+            return False
+        row = boxes[np.argmin(boxes[:, 0])]
+        x = row[0]
+        if self.park_x is None:
+            self.parking = x if self.parking is None else min(self.parking, x)
+
+        if abs(x - self.parking) < self.tolerance:
+            self.parked += 1
+        else:
+            self.parked = 0
+        if self.parked == self.matches:
+            self.box = row
+            return True
+        return False
+
+
+class KalmanExitPolicy(CapturePolicy):
+    """Takes a photo once the printhead has left the frame.
+
+    A constant-velocity Kalman filter follows the x-position of the most confident box,
+    with sampled frames treated as equally spaced. The head only counts as gone after
+    exit_misses frames in a row without a box for which the filter predicts its center
+    outside the frame, so a missed detection of a head parked at the edge doesn't. Two
+    positions within WIGGLE_ROOM in a row stop the predicted movement. One photo is
+    taken per exit, the next needs the head to come back first. Before the head was
+    seen once nothing is taken.
+    """
+    name = "kalman-exit"
+    state_fields = ("state", "covariance", "last_x", "misses", "exited")
+
+    def __init__(self, process_noise=PROCESS_NOISE, measurement_noise=MEASUREMENT_NOISE, exit_misses=EXIT_MISSES):
+        super().__init__()
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.exit_misses = exit_misses
+        self._F = np.array([[1.0, 1.0], [0.0, 1.0]])
+        self._Q = process_noise * np.array([[0.25, 0.5], [0.5, 1.0]])
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self.state = None           # x and speed per sample
+        self.covariance = None
+        self.last_x = None          # last measured position
+        self.misses = 0             # frames in a row without a box, predicted outside the frame
+        self.exited = False
+
+    @property
+    def holding(self):
+        return self.exited
+
+    def update(self, boxes):
+        self.box = None
+        if self.state is not None:
+            self.state = self._F @ self.state
+            self.covariance = self._F @ self.covariance @ self._F.T + self._Q
+
+        if len(boxes) == 0:
+            if self.state is None or self.exited:
+                return False
+            x = self.state[0]
+            self.misses = self.misses + 1 if x < 0 or x > 1 else 0
+            if self.misses >= self.exit_misses:
+                self.exited = True
+                return True
+            return False
+
+        x = boxes[np.argmax(boxes[:, 4]), 0]
+        self.exited = False
+        self.misses = 0
+        if self.state is None:
+            self.state = np.array([x, 0.0])
+            self.covariance = np.diag([self.measurement_noise, 1.0])
+            self.last_x = x
+            return False
+        # measurement of the position only
+        innovation = x - self.state[0]
+        gain = self.covariance[:, 0] / (self.covariance[0, 0] + self.measurement_noise)
+        self.state = self.state + gain * innovation
+        self.covariance = self.covariance - np.outer(gain, self.covariance[0])
+        # a head that stopped doesn't keep the speed it arrived with
+        if abs(x - self.last_x) < WIGGLE_ROOM:
+            self.state[1] = 0.0
+        self.last_x = x
+        return False
+
+
+POLICIES = {policy.name: policy for policy in (StillnessPolicy, LeftmostParkPolicy, KalmanExitPolicy)}
+
+
+def make_policy(name="stillness", **options):
+    """Returns a new policy by name, options are passed to its constructor."""
+    if name not in POLICIES:
+        raise ValueError(f"Unknown capture policy '{name}', expected one of {', '.join(POLICIES)}")
+    return POLICIES[name](**options)
+
+
+def _select(boxes, select):
+    if len(boxes) <= 1 or select == "each":
+        return boxes
+    if select == "leftmost":
+        return boxes[[np.argmin(boxes[:, 0])]]
+    return boxes[[np.argmax(boxes[:, 4])]]
+
+#---------------------------------------------------------------#
+# Traces
+#---------------------------------------------------------------#
+def trace_frames(trace):
+    """Splits a detection trace into (frame_index, boxes) per sampled frame, in order."""
+    table = np.column_stack([trace[column] for column in ("x", "y", "w", "h", "conf")]).astype(np.float64)
+    frames = trace["frame"]
+    starts = np.flatnonzero(np.r_[True, frames[1:] != frames[:-1]])
+    for start, end in zip(starts, np.r_[starts[1:], len(frames)]):
+        boxes = table[start:end]
+        # frames without a box are stored as one NaN row
+        yield int(frames[start]), boxes[~np.isnan(boxes[:, 0])]
+
+
+def evaluate(policy, trace):
+    """Feeds a trace to a fresh policy, returns the (frame_index, box) of every photo it takes."""
+    policy.reset()
+    return [(frame_index, policy.box) for frame_index, boxes in trace_frames(trace) if policy.update(boxes)]
+
+#---------------------------------------------------------------#
+# Benchmark & golden check
+#---------------------------------------------------------------#
+def benchmark(trace, repeat=5):
+    """Prints photos taken and the time per decision of every policy on trace."""
+    frames = list(trace_frames(trace))
+    report = []
+    for name in POLICIES:
+        policy = make_policy(name)
+        best = float("inf")
+        for _ in range(repeat):
+            policy.reset()
+            start = time.perf_counter()
+            photos = sum(policy.update(boxes) for _, boxes in frames)
+            best = min(best, time.perf_counter() - start)
+        per_frame = best / len(frames) * 1e6 if frames else 0.0
+        print(f"⏱️ {name}: {photos} photos, {per_frame:.1f} µs per frame ({len(frames)} frames)")
+        report.append({"policy": name, "photos": photos, "us_per_frame": per_frame})
+    return report
+
+
+def check_golden(trace, session_folder):
+    """Checks the stillness policy against the photos saved when the trace was recorded.
+
+    Returns True if the frames match, printing the differences otherwise. The
+    vectorized replay is checked against the same photos.
+    """
+    from manifest import read_manifest
+
+    entries = read_manifest(session_folder)
+    if entries is None:
+        raise ValueError(f"{session_folder} has no manifest to compare with")
+    expected = [entry["frame"] for entry in entries]
+    stepped = [frame_index for frame_index, _ in evaluate(StillnessPolicy(), trace)]
+
+    valid = ~np.isnan(trace["x"])
+    replayed = StillnessPolicy.replay(trace["x"][valid], [WIGGLE_ROOM], [MATCHES])[0]
+    vectorized = np.unique(trace["frame"][valid][replayed]).tolist()
+
+    ok = True
+    for label, frames in (("stillness policy", stepped), ("vectorized replay", vectorized)):
+        if frames == expected:
+            print(f"✅ {label}: same {len(frames)} photos as the session")
+            continue
+        ok = False
+        missing = sorted(set(expected) - set(frames))
+        extra = sorted(set(frames) - set(expected))
+        print(f"❌ {label}: {len(frames)} photos, session has {len(expected)}, "
+              f"missing {missing[:10]}, extra {extra[:10]}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the capture policies on a detection trace.")
+    parser.add_argument("trace", help=".npy detection trace")
+    parser.add_argument("session", nargs="?", help="session folder the trace was recorded with")
+    args = parser.parse_args(argv)
+
+    trace = np.load(args.trace)
+    benchmark(trace)
+    if args.session and not check_golden(trace, args.session):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
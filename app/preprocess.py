@@ -0,0 +1,88 @@
+import math
+
+import cv2
+import numpy as np
+
+#---------------------------------------------------------------#
+# Region of interest & inference resolution
+#---------------------------------------------------------------#
+class FramePreprocessor:
+    """Crops frames to a region of interest and shrinks them before inference.
+
+    roi is (x0, y0, x1, y1) in normalized full-frame coordinates, max_size the longest
+    side of the image given to the model. Boxes found on the small image are mapped back
+    to normalized full-frame coordinates with normalize(), so the capture rule doesn't
+    notice the difference. Without roi and max_size frames pass through unchanged.
+    """
+
+    def __init__(self, roi=None, max_size=None):
+        if roi is not None:
+            x0, y0, x1, y1 = roi
+            if not (0 <= x0 < x1 <= 1 and 0 <= y0 < y1 <= 1):
+                raise ValueError(f"ROI must satisfy 0 <= x0 < x1 <= 1 and 0 <= y0 < y1 <= 1, got {roi}")
+        if max_size is not None and max_size < 32:
+            raise ValueError(f"Inference size must be at least 32 pixels, got {max_size}")
+        self.roi = roi
+        self.max_size = max_size
+        self._shape = None
+
+    @property
+    def imgsz(self):
+        """The predict imgsz matching max_size (a multiple of 32), or None for the model default."""
+        if self.max_size is None:
+            return None
+        return int(math.ceil(self.max_size / 32) * 32)
+
+    def predict_kwargs(self):
+        """Extra keyword arguments for model.predict."""
+        return {} if self.imgsz is None else {"imgsz": self.imgsz}
+
+    def __call__(self, frame):
+        """Returns the image to run inference on."""
+        self._update(frame.shape)
+        if self.roi is not None:
+            x0, y0, x1, y1 = self._crop
+            frame = frame[y0:y1, x0:x1]
+        if self._size is not None:
+            frame = cv2.resize(frame, self._size, interpolation=cv2.INTER_AREA)
+        return frame
+
+    def normalize(self, xywh, frame_shape):
+        """Maps an (x, y, w, h) box of the inference image to normalized full-frame coordinates."""
+        self._update(frame_shape)
+        hImg, wImg = frame_shape[:2]
+        x, y, w, h = xywh
+        x0, y0, _, _ = self._crop
+        sx, sy = self._scale_xy
+        return (x0 + x/sx)/wImg, (y0 + y/sy)/hImg, w/sx/wImg, h/sy/hImg
+
+    def normalize_boxes(self, xywh, frame_shape):
+        """Maps an (N, 4) array of (x, y, w, h) boxes like normalize(), all at once."""
+        self._update(frame_shape)
+        hImg, wImg = frame_shape[:2]
+        x0, y0, _, _ = self._crop
+        sx, sy = self._scale_xy
+        x, y, w, h = np.asarray(xywh, dtype=np.float64).reshape(-1, 4).T
+        return np.column_stack([(x0 + x/sx)/wImg, (y0 + y/sy)/hImg, w/sx/wImg, h/sy/hImg])
+
+    def _update(self, shape):
+        # crop and scale only depend on the frame size, so compute them once per size
+        if shape[:2] == self._shape:
+            return
+        hImg, wImg = shape[:2]
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            crop = (int(x0*wImg), int(y0*hImg), int(math.ceil(x1*wImg)), int(math.ceil(y1*hImg)))
+        else:
+            crop = (0, 0, wImg, hImg)
+        cw, ch = crop[2] - crop[0], crop[3] - crop[1]
+
+        self._crop = crop
+        self._size = None
+        self._scale_xy = (1, 1)
+        if self.max_size is not None and max(cw, ch) > self.max_size:
+            scale = self.max_size / max(cw, ch)
+            self._size = (max(1, round(cw*scale)), max(1, round(ch*scale)))
+            # the rounded size, not scale, is what the box coordinates refer to
+            self._scale_xy = (self._size[0]/cw, self._size[1]/ch)
+        self._shape = shape[:2]
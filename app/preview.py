@@ -0,0 +1,97 @@
+import threading
+import time
+
+import cv2
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtGui import QImage
+
+from models import get_model
+from preprocess import FramePreprocessor
+
+PREVIEW_SIZE = (426, 240)
+PREVIEW_INTERVAL = 0.05  # seconds between two preview frames (20 fps)
+DETECTION_SIZE = 320     # longest side of the image the preview detection runs on
+
+#---------------------------------------------------------------#
+# Preview worker
+#---------------------------------------------------------------#
+class PreviewWorker(QThread):
+    """Reads preview frames on its own thread and turns them into ready-to-paint images.
+
+    cap is usually a FrameSource subscription, so the preview doesn't take frames away
+    from the processing thread.
+
+    frame_ready is emitted when a new image is waiting, take_frame() returns it. If the
+    GUI hasn't taken the last image yet it is replaced, so stale frames are dropped
+    instead of piling up in the event queue.
+    """
+    frame_ready = pyqtSignal()
+
+    def __init__(self, cap, detection=False):
+        super().__init__()
+        self.cap = cap
+        self.detection = detection
+        self.running = True
+        self.preprocessor = FramePreprocessor(max_size=DETECTION_SIZE)
+        self._latest = None
+        self._lock = threading.Lock()
+
+    def set_detection(self, enabled):
+        self.detection = enabled
+
+    def take_frame(self):
+        """Returns the newest QImage, or None if there is nothing new."""
+        with self._lock:
+            image, self._latest = self._latest, None
+        return image
+
+    def stop(self):
+        self.running = False
+        self.cap.release()
+
+    def run(self):
+        while self.running and self.cap.isOpened():
+            start = time.monotonic()
+            ret, frame = self.cap.read()
+            if ret:
+                self._publish(self._render(frame))
+
+            remaining = PREVIEW_INTERVAL - (time.monotonic() - start)
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def _render(self, frame):
+        boxes = self._detect(frame) if self.detection else []
+
+        # shrink first, so drawing and color conversion only touch preview pixels
+        w, h = PREVIEW_SIZE
+        image = cv2.resize(frame, PREVIEW_SIZE, interpolation=cv2.INTER_AREA)
+        for xNorm, yNorm, wNorm, hNorm, conf in boxes:
+            x_min, y_min = int((xNorm - wNorm/2) * w), int((yNorm - hNorm/2) * h)
+            x_max, y_max = int((xNorm + wNorm/2) * w), int((yNorm + hNorm/2) * h)
+            cv2.rectangle(image, (x_min, y_min), (x_max, y_max), (0, 255, 0), 2)
+            cv2.putText(image, f"Conf: {conf:.2f}", (x_min, y_min - 5),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 0), 1)
+
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        # copy, so the QImage doesn't point into a numpy buffer that goes away
+        return QImage(image.data, w, h, 3 * w, QImage.Format_RGB888).copy()
+
+    def _detect(self, frame):
+        """Returns normalized (x, y, w, h, conf) boxes found on a downscaled copy of frame."""
+        # the model is loaded on first use and shared with the processing threads
+        results = get_model().predict(self.preprocessor(frame), conf=0.5, verbose=False,
+                                      **self.preprocessor.predict_kwargs())
+        boxes = []
+        for r in results:
+            for box in r.boxes:
+                xywh = box.xywh[0].tolist()
+                boxes.append((*self.preprocessor.normalize(xywh, frame.shape), float(box.conf[0])))
+        return boxes
+
+    def _publish(self, image):
+        with self._lock:
+            waiting = self._latest is not None
+            self._latest = image
+        if not waiting:
+            self.frame_ready.emit()
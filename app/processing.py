@@ -0,0 +1,216 @@
+import cv2
+import time
+
+import numpy as np
+
+from bestframe import finish_window, session_policy
+from manifest import SessionManifest
+from metrics import StageStats
+from preprocess import FramePreprocessor
+from sampling import SAMPLE_INTERVAL, FrameSampler
+from writer import Capture, PhotoWriter
+
+STAGES = ("decode", "inference", "decision", "write")
+
+#---------------------------------------------------------------#
+# Inference
+#---------------------------------------------------------------#
+class Detector:
+    """Runs the model on preprocessed images, one predict call per list of images.
+
+    With a MotionGate, images that barely changed since the last inference reuse the
+    previous result instead of running the model.
+    """
+
+    def __init__(self, model, preprocessor=None, motion_gate=None, verbose=True):
+        self.model = model
+        self.preprocessor = preprocessor or FramePreprocessor()
+        self.motion_gate = motion_gate
+        self.verbose = verbose
+        self.last_result = None
+        self.inferred = 0
+        self.skipped = 0
+
+    def detect(self, images):
+        """Returns one result per image, in order."""
+        todo = self.plan(images)
+        inferred = predict(self.model, [images[i] for i in todo], self.preprocessor, self.verbose) if todo else []
+        return self.results(len(images), todo, inferred)
+
+    def plan(self, images):
+        """Feeds images to the motion gate, returns the indices of those the model has to run on."""
+        todo = []
+        for i, image in enumerate(images):
+            changed = self.motion_gate is None or self.motion_gate.changed(image)
+            # there is nothing to reuse before the first inference
+            if changed or (self.last_result is None and not todo):
+                todo.append(i)
+        self.inferred += len(todo)
+        self.skipped += len(images) - len(todo)
+        return todo
+
+    def results(self, count, todo, inferred):
+        """Returns one result for each of count planned images, given the results of those in todo."""
+        results = []
+        inferred = dict(zip(todo, inferred))
+        for i in range(count):
+            if i in inferred:
+                self.last_result = inferred[i]
+            results.append(self.last_result)
+        return results
+
+
+def predict(model, images, preprocessor, verbose=False):
+    """Runs the model on a list of images preprocessed alike in one call, returns one result per image."""
+    return model.predict(images if len(images) > 1 else images[0], device="cpu", verbose=verbose,
+                         **preprocessor.predict_kwargs())
+
+#---------------------------------------------------------------#
+# Saving captures
+#---------------------------------------------------------------#
+class CaptureSink:
+    """Hands the captures of a session to its PhotoWriter and timelapse and counts them.
+
+    captures starts at the number of photos taken earlier, e.g. by a resumed run. With
+    a StageStats as stage, the time spent handing photos to the writer is recorded.
+    """
+
+    def __init__(self, photos, timelapse=None, captures=0, stage=None):
+        self.photos = photos
+        self.timelapse = timelapse
+        self.captures = captures
+        self.stage = stage
+
+    def save(self, capture):
+        start = time.perf_counter()
+        self.photos.write(capture)
+        if self.stage is not None:
+            self.stage.add(time.perf_counter() - start)
+        self.captures += 1
+        if self.timelapse is not None:
+            self.timelapse.add(capture.frame)
+
+#---------------------------------------------------------------#
+# Processing loop
+#---------------------------------------------------------------#
+def process_capture(cap, output_folder, model, should_stop=None, verbose=True, interval=SAMPLE_INTERVAL,
+                    batch_size=1, preprocessor=None, motion_gate=None, timelapse=None, trace=None, policy=None,
+                    selector=None, writer_options=None, checkpoint=None, start_frame=0, end_frame=None):
+    """Runs detection on an opened VideoCapture every `interval` seconds and saves the frames the policy picks.
+
+    Returns counters (frames, sampled, inferred, skipped, captures, resumed_from), seconds,
+    the time per stage and the writer's stats.
+    """
+    if batch_size < 1:
+        raise ValueError(f"Batch size must be at least 1, got {batch_size}")
+    policy = session_policy(policy, selector)
+    stats = {"captures": 0, "resumed_from": 0}
+    saved = checkpoint.load() if checkpoint is not None else None
+    if saved is not None:
+        start_frame = max(start_frame, saved["next_frame"])
+        policy.load_state(saved["policy"])
+        stats.update(captures=saved["captures"], resumed_from=saved["next_frame"])
+        if verbose:
+            print(f"⏩ Resuming at frame {saved['next_frame']} with {saved['captures']} photos taken")
+
+    sampler = FrameSampler(cap, interval=interval, should_stop=should_stop, start_frame=start_frame,
+                           end_frame=end_frame)
+    detector = Detector(model, preprocessor=preprocessor, motion_gate=motion_gate, verbose=verbose)
+    stages = {name: StageStats() for name in STAGES}
+    start = time.perf_counter()
+
+    with SessionManifest(output_folder) as manifest, \
+            PhotoWriter(output_folder, manifest=manifest, **(writer_options or {})) as photos:
+        sink = CaptureSink(photos, timelapse, captures=stats["captures"], stage=stages["write"])
+        batch = []
+        decode_start = time.perf_counter()
+        for frame_count, frame in sampler:
+            stages["decode"].add(time.perf_counter() - decode_start)
+            batch.append((frame_count, frame))
+            if len(batch) >= batch_size:
+                _infer_and_capture(detector, batch, policy, sink, stages, trace, selector)
+                # a best-frame window can't be resumed, so it is left out of checkpoints
+                if checkpoint is not None and checkpoint.due() and not (selector and selector.in_window):
+                    photos.drain()
+                    checkpoint.save(batch[-1][0] + 1, policy, sink.captures)
+                batch = []
+            decode_start = time.perf_counter()
+        if batch:
+            _infer_and_capture(detector, batch, policy, sink, stages, trace, selector)
+        finish_window(selector, sink)
+        if checkpoint is not None:
+            photos.drain()
+            stopped = should_stop is not None and should_stop()
+            checkpoint.save(sampler.position, policy, sink.captures, finished=not stopped)
+
+    stats["captures"] = sink.captures
+
+    stats["frames"] = sampler.position
+    stats["sampled"] = sampler.decoded
+    stats["inferred"] = detector.inferred
+    stats["skipped"] = detector.skipped
+    stats["seconds"] = time.perf_counter() - start
+    stats["stages"] = {name: stage.summary() for name, stage in stages.items()}
+    stats["writer"] = photos.stats()
+    return stats
+
+
+def _infer_and_capture(detector, batch, policy, sink, stages, trace=None, selector=None):
+    """Runs detection on a list of (frame_count, frame) and saves the frames chosen by policy or selector."""
+    preprocessor = detector.preprocessor
+    start = time.perf_counter()
+    results = detector.detect([preprocessor(frame) for _, frame in batch])
+    stages["inference"].add(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    captures = list(detect_captures(policy, batch, results, preprocessor, trace, selector))
+    stages["decision"].add(time.perf_counter() - start)
+
+    for capture in captures:
+        sink.save(capture)
+
+
+def detect_captures(policy, batch, results, preprocessor=None, trace=None, selector=None):
+    """Feeds the results of a list of (frame_count, frame) to policy in order, yields a Capture per frame to save.
+
+    The boxes are mapped back to full-frame coordinates with preprocessor if the model saw a
+    cropped or resized image. The boxes of every frame are also added to trace (a
+    DetectionTrace) if one is given. With a BestFrameSelector the frames go through the
+    selector instead, which yields the best frame of a parked window once it closes;
+    call selector.flush() at the end of the source for the last one.
+    """
+    preprocessor = preprocessor or FramePreprocessor()
+    for (frame_count, frame), r in zip(batch, results):
+        boxes = frame_boxes(r, frame.shape, preprocessor)
+        if trace is not None:
+            trace.add(frame_count, boxes)
+        if selector is not None:
+            capture = selector.update(frame_count, frame, boxes)
+            if capture is not None:
+                yield capture
+        elif policy.update(boxes):
+            box = policy.box
+            if box is None:
+                yield Capture(frame_count, frame, None, None)
+            else:
+                yield Capture(frame_count, frame, tuple(box[:4].tolist()), float(box[4]))
+
+
+def frame_boxes(result, frame_shape, preprocessor):
+    """Returns the boxes of one result as an (N, 5) array of normalized full-frame x, y, w, h, conf."""
+    boxes = result.boxes.cpu().numpy()
+    if len(boxes) == 0:
+        return np.empty((0, 5))
+    xywh = preprocessor.normalize_boxes(boxes.xywh, frame_shape)
+    return np.column_stack([xywh, boxes.conf])
+
+
+def process_video(video_path, output_folder, model, **options):
+    """Opens a video file, processes it with process_capture, passing options on, and releases it again."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video file: {video_path}")
+    try:
+        return process_capture(cap, output_folder, model, **options)
+    finally:
+        cap.release()
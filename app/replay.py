@@ -0,0 +1,256 @@
+"""Detection traces: re-tune the capture rule without running the model again.
+
+Usage:
+    python replay.py <video> --wiggle-room 0.001 0.003 0.005 --matches 2 3
+    python replay.py <video> --wiggle-room 0.002 --matches 2 -o <output folder>
+    python replay.py <video> --policy kalman-exit -o <output folder>
+
+Processing a video file stores the detections of every sampled frame in a small
+.npy trace, keyed by a hash of the video, a hash of the weights and the settings
+that change what the model sees. Replay evaluates the stillness rule on the trace
+for every combination of parameters and prints how many photos each would take,
+--policy replays one of the other capture policies instead. With a single
+combination and -o, only the chosen frames are read from the video and saved into
+a new session folder.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from manifest import SessionManifest
+from models import WEIGHTS_PATH
+from policies import MATCHES, POLICIES, WIGGLE_ROOM, StillnessPolicy, evaluate, make_policy
+from processing import Capture
+from sampling import SAMPLE_INTERVAL, FrameSampler
+from writer import PhotoWriter
+
+TRACE_DIR = os.path.join(os.path.expanduser("~"), ".dont-blink", "traces")
+HASH_CHUNK = 1 << 20
+
+# one row per box, frames without a box get one row with NaN coordinates
+TRACE_DTYPE = np.dtype([("frame", "<i4"), ("x", "<f8"), ("y", "<f8"), ("w", "<f8"), ("h", "<f8"),
+                        ("conf", "<f4")])
+
+#---------------------------------------------------------------#
+# Recording
+#---------------------------------------------------------------#
+class DetectionTrace:
+    """Collects the normalized boxes of every sampled frame in the order they were decided on."""
+
+    def __init__(self):
+        self._rows = []
+
+    def add(self, frame_index, boxes):
+        """Adds the (x, y, w, h, conf) boxes of one sampled frame, an empty list is recorded too."""
+        if len(boxes) == 0:
+            self._rows.append((frame_index, np.nan, np.nan, np.nan, np.nan, np.nan))
+        for box in boxes:
+            self._rows.append((frame_index, *box))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def array(self):
+        return np.array(self._rows, dtype=TRACE_DTYPE)
+
+    def save(self, path):
+        return save_trace(path, self.array())
+
+
+def save_trace(path, trace):
+    """Writes a trace array to path, replacing an older trace only once the new one is complete."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp.npy"
+    np.save(temp_path, trace)
+    os.replace(temp_path, path)
+    return path
+
+
+def load_trace(path):
+    """Returns the trace array stored at path, or None if there is none."""
+    if not os.path.isfile(path):
+        return None
+    return np.load(path)
+
+
+def trace_path(video_path, weights_path=WEIGHTS_PATH, interval=SAMPLE_INTERVAL, preprocessor=None,
+               motion_gate=None, backend="torch", int8=False, trace_dir=TRACE_DIR):
+    """Returns where the trace of video_path processed with these settings is cached."""
+    settings = {"interval": interval, "backend": backend, "int8": int8, "roi": None, "max_size": None}
+    if preprocessor is not None:
+        settings.update(roi=preprocessor.roi, max_size=preprocessor.max_size)
+    if motion_gate is not None:
+        settings.update(motion=[motion_gate.threshold, motion_gate.pixel_threshold, motion_gate.size,
+                                motion_gate.max_skips])
+    settings_hash = hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+    name = f"{file_hash(video_path)[:16]}_{file_hash(weights_path, full=True)[:16]}_{settings_hash[:8]}.npy"
+    return os.path.join(trace_dir, name)
+
+
+def file_hash(path, full=False):
+    """Returns a SHA-1 over the size and the content of path.
+
+    Videos are large, so unless full is set only the first and last megabyte are read.
+    That is enough to tell recordings apart.
+    """
+    digest = hashlib.sha1()
+    size = os.path.getsize(path)
+    digest.update(str(size).encode())
+    with open(path, "rb") as f:
+        if full or size <= 2 * HASH_CHUNK:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+        else:
+            digest.update(f.read(HASH_CHUNK))
+            f.seek(-HASH_CHUNK, os.SEEK_END)
+            digest.update(f.read(HASH_CHUNK))
+    return digest.hexdigest()
+
+
+def record_trace(video_path, weights_path=WEIGHTS_PATH, interval=SAMPLE_INTERVAL, preprocessor=None,
+                 motion_gate=None, backend="torch", int8=False):
+    """Runs the model over video_path once, caches its trace and returns the trace array."""
+    import tempfile
+
+    from models import get_model
+    from processing import process_video
+
+    model = get_model(weights_path, backend=backend, int8=int8)
+    trace = DetectionTrace()
+    with tempfile.TemporaryDirectory() as scratch:
+        process_video(video_path, scratch, model, verbose=False, interval=interval, preprocessor=preprocessor,
+                      motion_gate=motion_gate, trace=trace)
+    trace.save(trace_path(video_path, weights_path, interval, preprocessor, motion_gate, backend, int8))
+    return trace.array()
+
+#---------------------------------------------------------------#
+# Replay
+#---------------------------------------------------------------#
+def replay(trace, wiggle_rooms=(WIGGLE_ROOM,), matches=(MATCHES,)):
+    """Evaluates the stillness rule on a trace for parameter sets of equal length.
+
+    Returns one list of captures per parameter set, each capture the (frame_index, box)
+    of a photo like policies.evaluate() returns them.
+    """
+    valid = trace[~np.isnan(trace["x"])]
+    table = np.column_stack([valid[column] for column in ("x", "y", "w", "h", "conf")]).astype(np.float64)
+    report = []
+    for row in StillnessPolicy.replay(valid["x"], wiggle_rooms, matches):
+        # a frame with several boxes can trigger twice, it is saved once
+        frames, first = np.unique(valid["frame"][row], return_index=True)
+        report.append(list(zip(frames.tolist(), table[row][first])))
+    return report
+
+
+def grid_search(trace, wiggle_rooms, matches):
+    """Replays every combination of the parameters, returns one dict per combination."""
+    grid = list(itertools.product(wiggle_rooms, matches))
+    start = time.perf_counter()
+    captures = replay(trace, [w for w, _ in grid], [m for _, m in grid])
+    seconds = time.perf_counter() - start
+    report = []
+    for (wiggle_room, match), photos in zip(grid, captures):
+        report.append({"wiggle_room": wiggle_room, "matches": match, "captures": len(photos),
+                       "frames": [frame_index for frame_index, _ in photos]})
+    print(f"🔁 {len(grid)} parameter sets over {len(trace)} detections in {seconds * 1000:.1f} ms")
+    return report
+
+
+def extract_frames(video_path, captures, output_folder, writer_options=None):
+    """Reads only the frames of captures, a list of (frame_index, box), from the video and saves them.
+
+    The photos and the session manifest look like those of a normal processing run,
+    writer_options (format, quality, spill_frames, ...) are passed to the PhotoWriter.
+    Returns the number of photos saved.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video file: {video_path}")
+    os.makedirs(output_folder, exist_ok=True)
+    boxes = dict(captures)
+    saved = 0
+    try:
+        sampler = FrameSampler(cap)
+        with SessionManifest(output_folder) as manifest, \
+                PhotoWriter(output_folder, manifest=manifest, **(writer_options or {})) as photos:
+            for frame_index, frame in sampler.read_at(sorted(boxes)):
+                box = boxes[frame_index]
+                if box is None:
+                    photos.write(Capture(frame_index, frame, None, None))
+                else:
+                    photos.write(Capture(frame_index, frame, tuple(float(v) for v in box[:4]), float(box[4])))
+                saved += 1
+    finally:
+        cap.release()
+    return saved
+
+#---------------------------------------------------------------#
+# Entry point
+#---------------------------------------------------------------#
+def main(argv=None):
+    from models import BACKENDS
+    from motion import MAX_SKIPS, MotionGate
+    from preprocess import FramePreprocessor
+
+    parser = argparse.ArgumentParser(description="Re-tune the capture rule on a recorded detection trace.")
+    parser.add_argument("video", help="processed video file")
+    parser.add_argument("--wiggle-room", type=float, nargs="+", default=[WIGGLE_ROOM],
+                        help="largest x movement that still counts as standing still")
+    parser.add_argument("--matches", type=int, nargs="+", default=[MATCHES],
+                        help="still detections in a row before a photo is taken")
+    parser.add_argument("--policy", choices=list(POLICIES), default="stillness",
+                        help="replay another capture policy with its defaults instead of the grid")
+    parser.add_argument("-o", "--output", help="save the chosen frames of a single parameter set here")
+    parser.add_argument("--weights", default=WEIGHTS_PATH, help="path to the YOLO weights")
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL,
+                        help="seconds of video between two inferred frames")
+    parser.add_argument("--roi", type=float, nargs=4, metavar=("X0", "Y0", "X1", "Y1"),
+                        help="only run the model on this normalized region of the frame")
+    parser.add_argument("--imgsz", type=int, default=None, help="longest side of the image given to the model")
+    parser.add_argument("--motion-threshold", type=float, default=None,
+                        help="motion threshold the video was processed with")
+    parser.add_argument("--motion-max-skips", type=int, default=MAX_SKIPS,
+                        help="motion max skips the video was processed with")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch", help="backend the video was processed with")
+    parser.add_argument("--int8", action="store_true", help="the video was processed with an INT8 model")
+    args = parser.parse_args(argv)
+    preprocessor = FramePreprocessor(roi=args.roi, max_size=args.imgsz)
+    motion_gate = None
+    if args.motion_threshold is not None:
+        motion_gate = MotionGate(threshold=args.motion_threshold, max_skips=args.motion_max_skips)
+
+    # the trace is only found with the settings the video was processed with
+    path = trace_path(args.video, args.weights, args.interval, preprocessor, motion_gate, args.backend, args.int8)
+    trace = load_trace(path)
+    if trace is None:
+        print("🔍 No trace for this video yet, running the model once...")
+        trace = record_trace(args.video, args.weights, args.interval, preprocessor, motion_gate, args.backend,
+                             args.int8)
+
+    if args.policy != "stillness":
+        captures = evaluate(make_policy(args.policy), trace)
+        print(f"   {args.policy}: {len(captures)} photos")
+    else:
+        report = grid_search(trace, args.wiggle_room, args.matches)
+        for item in report:
+            print(f"   wiggle room {item['wiggle_room']:g}, {item['matches']} matches: {item['captures']} photos")
+        if args.output:
+            if len(report) != 1:
+                parser.error("-o needs exactly one --wiggle-room and one --matches value")
+            captures = replay(trace, args.wiggle_room, args.matches)[0]
+
+    if args.output:
+        saved = extract_frames(args.video, captures, args.output)
+        print(f"✅ {saved} photos saved in {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
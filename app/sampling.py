@@ -0,0 +1,119 @@
+import itertools
+import math
+import time
+
+import cv2
+
+SAMPLE_INTERVAL = 0.25  # seconds between two inferred frames
+SEEK_GAP = 150          # skip larger gaps in files by seeking instead of grabbing
+DEFAULT_FPS = 30
+
+#---------------------------------------------------------------#
+# Frame sampling
+#---------------------------------------------------------------#
+class FrameSampler:
+    """Yields (frame_index, frame) once every `interval` seconds and only decodes those frames.
+
+    Frames in between are skipped with grab(), which demuxes the frame but skips the
+    retrieve/color conversion. Video files are sampled on their own timeline: the
+    sample times are exact multiples of the interval and gaps longer than `seek_gap`
+    frames are skipped by seeking. Live cameras are sampled on the wall clock.
+
+    start_frame and end_frame limit a video file to the samples in [start_frame,
+    end_frame). The samples stay on the grid of the whole file, so a file processed in
+    pieces is sampled exactly like in one go.
+    """
+
+    def __init__(self, cap, interval=SAMPLE_INTERVAL, seek_gap=SEEK_GAP, should_stop=None, start_frame=0,
+                 end_frame=None):
+        if interval <= 0:
+            raise ValueError(f"Sample interval must be positive, got {interval}")
+        self.cap = cap
+        self.interval = interval
+        self.seek_gap = seek_gap
+        self.should_stop = should_stop
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+
+        self.is_file = cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        if not fps or math.isnan(fps) or fps <= 0:
+            fps = DEFAULT_FPS
+        self.fps = fps
+
+        self.position = 0   # index of the next frame the capture will return
+        self.decoded = 0
+        self.grabbed = 0
+
+    def __iter__(self):
+        if self.is_file:
+            return self._sample_file()
+        return self._sample_live()
+
+    def _stopped(self):
+        return self.should_stop is not None and self.should_stop()
+
+    def read_at(self, indices):
+        """Yields (frame_index, frame) for increasing frame indices of a video file.
+
+        Indices behind the current position are skipped.
+        """
+        for target in indices:
+            if self._stopped():
+                break
+            if target < self.position:
+                continue
+            if not self._advance_to(target):
+                break
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            self.position += 1
+            self.decoded += 1
+            yield target, frame
+
+    def _sample_file(self):
+        step = self.interval * self.fps
+        # round half up, so 7.5 frames at 30 fps alternates between 8 and 7
+        indices = (int(k * step + 0.5) for k in itertools.count())
+        indices = itertools.dropwhile(lambda index: index < self.start_frame, indices)
+        if self.end_frame is not None:
+            indices = itertools.takewhile(lambda index: index < self.end_frame, indices)
+        return self.read_at(indices)
+
+    def _advance_to(self, target):
+        if target - self.position > self.seek_gap:
+            if not self.cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+                return False
+            self.position = target
+            return True
+
+        while self.position < target:
+            if self._stopped() or not self.cap.grab():
+                return False
+            self.position += 1
+            self.grabbed += 1
+        return True
+
+    def _sample_live(self):
+        next_due = time.monotonic()
+        while not self._stopped():
+            if not self.cap.grab():
+                break
+            index = self.position
+            self.position += 1
+
+            now = time.monotonic()
+            if now < next_due:
+                self.grabbed += 1
+                continue
+
+            ret, frame = self.cap.retrieve()
+            if not ret:
+                break
+            self.decoded += 1
+            next_due += self.interval
+            # don't burst to catch up after a slow inference
+            if next_due < now:
+                next_due = now + self.interval
+            yield index, frame
@@ -0,0 +1,417 @@
+import http.client
+import math
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import cv2
+import numpy as np
+
+from metrics import StageStats
+
+DEFAULT_FPS = 30
+GRAB_TIMEOUT = 5.0      # seconds a subscriber waits for a new frame before giving up, plus the read timeout on streams
+OPEN_TIMEOUT = 5.0      # seconds to connect to a network camera
+READ_TIMEOUT = 5.0      # seconds without data before a network stream counts as dropped
+RECONNECT_DELAY = 1.0   # first wait before reconnecting, doubled after every failed attempt
+MAX_RECONNECT_DELAY = 30.0
+MAX_LINE = 1 << 16      # longest MJPEG part header line
+
+# FFmpeg options for RTSP: TCP doesn't lose packets and the demuxer buffers nothing
+FFMPEG_OPTIONS = "rtsp_transport;tcp|fflags;nobuffer|flags;low_delay"
+FFMPEG_OPTIONS_VAR = "OPENCV_FFMPEG_CAPTURE_OPTIONS"
+
+_ffmpeg_options_lock = threading.Lock()
+
+#---------------------------------------------------------------#
+# Frame source
+#---------------------------------------------------------------#
+class FrameSource:
+    """Owns one VideoCapture and reads it continuously on its own thread.
+
+    Every frame read becomes the latest frame. Consumers subscribe() and pick up the
+    latest frame at their own rate, so preview, detector and recorder no longer steal
+    frames from each other. Frames are shared between subscribers without copying;
+    each frame is a new array, so a subscriber may keep it, but must not modify it.
+
+    A video file can act as a live source for previews: with realtime it is read at
+    its own frame rate and with loop it restarts at the end.
+
+    latency records how long every frame handed to a subscriber waited since it was
+    read, stats() reports it with the frames read and the measured frame rate.
+    """
+
+    grab_timeout = GRAB_TIMEOUT
+
+    def __init__(self, cap, loop=False, realtime=False):
+        self.cap = cap
+        self.loop = loop
+        self.realtime = realtime
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and not math.isnan(fps) and fps > 0 else DEFAULT_FPS
+
+        self.frames_read = 0
+        self.reconnects = 0
+        self.latency = StageStats()
+        self._started = None
+        self._index = -1
+        self._frame = None
+        self._arrived = None
+        self._subscribers = []
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._alive = False
+        self._thread = None
+
+    @property
+    def alive(self):
+        return self._alive
+
+    def start(self):
+        """Starts the reader thread, does nothing if it is already running."""
+        with self._cond:
+            if self._thread is not None:
+                return self
+            self._alive = self.cap.isOpened()
+            if not self._alive:
+                return self
+            self._started = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name="frame-source", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the reader thread and releases the capture."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._cond:
+            self._alive = False
+            self._cond.notify_all()
+        self.cap.release()
+
+    def subscribe(self):
+        """Returns a new VideoCapture-like Subscription, starting the source if needed."""
+        self.start()
+        subscription = Subscription(self)
+        with self._cond:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._cond:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+            self._cond.notify_all()
+
+    @property
+    def reconnecting(self):
+        return False
+
+    def stats(self):
+        """Returns frames read, the frame rate they arrived at, reconnects and the latency."""
+        seconds = time.monotonic() - self._started if self._started else 0.0
+        return {
+            "frames_read": self.frames_read,
+            "fps": self.frames_read / seconds if seconds else 0.0,
+            "reconnects": self.reconnects,
+            "latency": self.latency.summary(),
+        }
+
+    @property
+    def subscribers(self):
+        with self._cond:
+            return len(self._subscribers)
+
+    def latest(self):
+        """Returns (index, frame) of the newest frame, frame is None before the first one."""
+        with self._cond:
+            return self._index, self._frame
+
+    def wait_newer(self, index, timeout=None, cancelled=None):
+        """Waits for a frame newer than index, returns (index, frame) or (index, None) on timeout."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._index > index or not self._alive or (cancelled is not None and cancelled()),
+                timeout)
+            if self._index > index:
+                self.latency.add(time.monotonic() - self._arrived)
+                return self._index, self._frame
+            return index, None
+
+    def _run(self):
+        period = 1 / self.fps
+        next_due = time.monotonic()
+        rewound = False
+        try:
+            while not self._stop.is_set():
+                ret, frame = self.cap.read()
+                if not ret:
+                    # rewind once, a second failure in a row means the file is unreadable
+                    if self.loop and not rewound and self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0):
+                        rewound = True
+                        continue
+                    if self._reconnect():
+                        continue
+                    break
+                rewound = False
+                self.frames_read += 1
+
+                with self._cond:
+                    self._index += 1
+                    self._frame = frame
+                    self._arrived = time.monotonic()
+                    self._cond.notify_all()
+
+                if self.realtime:
+                    next_due += period
+                    delay = next_due - time.monotonic()
+                    if delay > 0:
+                        self._stop.wait(delay)
+                    else:
+                        next_due = time.monotonic()
+        finally:
+            with self._cond:
+                self._alive = False
+                self._cond.notify_all()
+
+    def _reconnect(self):
+        """Called when a read fails, returns True if reading can go on."""
+        return False
+
+
+class NetworkSource(FrameSource):
+    """A FrameSource for a printer camera on the network, e.g. http://printer/webcam/?action=stream.
+
+    The stream is read as fast as it arrives and only the latest frame is kept, so
+    subscribers never get frames that queued up while they were busy. MJPEG over
+    HTTP is parsed directly off the socket, other schemes (RTSP) are opened with
+    FFmpeg without its demuxer buffer. A stream that drops or stalls for
+    read_timeout seconds is reopened with exponential backoff until it is back or the
+    source is stopped. Meanwhile alive stays True and subscribers keep waiting.
+    """
+
+    def __init__(self, url, read_timeout=READ_TIMEOUT):
+        self.url = url
+        self.read_timeout = read_timeout
+        # a stalled stream is only noticed after read_timeout, subscribers must wait longer than that
+        self.grab_timeout = read_timeout + GRAB_TIMEOUT
+        self._reconnecting = False
+        super().__init__(open_stream(url, read_timeout))
+
+    @property
+    def reconnecting(self):
+        with self._cond:
+            return self._reconnecting
+
+    def _set_reconnecting(self, reconnecting):
+        with self._cond:
+            self._reconnecting = reconnecting
+            self._cond.notify_all()
+
+    def _reconnect(self):
+        self.cap.release()
+        self._set_reconnecting(True)
+        delay = RECONNECT_DELAY
+        try:
+            while not self._stop.is_set():
+                print(f"🔌 Lost {self.url}, reconnecting in {delay:g}s")
+                if self._stop.wait(delay):
+                    break
+                cap = open_stream(self.url, self.read_timeout)
+                if cap.isOpened():
+                    self.cap = cap
+                    self.reconnects += 1
+                    print(f"✅ Reconnected to {self.url}")
+                    return True
+                cap.release()
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+            return False
+        finally:
+            self._set_reconnecting(False)
+
+
+class MjpegCapture:
+    """Reads an MJPEG stream over HTTP (multipart/x-mixed-replace) with the VideoCapture API.
+
+    Every grab() reads the next JPEG part straight from the socket, nothing is
+    buffered in between. A read that gets no data for timeout seconds fails.
+    """
+
+    def __init__(self, url, timeout=READ_TIMEOUT):
+        self.url = url
+        self._data = None
+        try:
+            self._response = urllib.request.urlopen(url, timeout=timeout)
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            print(f"⚠️ Could not connect to {url}: {e}")
+            self._response = None
+
+    def isOpened(self):
+        return self._response is not None
+
+    def grab(self):
+        if self._response is None:
+            return False
+        try:
+            self._data = self._next_part()
+        except (OSError, ValueError, http.client.HTTPException):
+            self._data = None
+        if self._data is None:
+            self.release()
+            return False
+        return True
+
+    def retrieve(self):
+        if self._data is None:
+            return False, None
+        frame = cv2.imdecode(np.frombuffer(self._data, np.uint8), cv2.IMREAD_COLOR)
+        return frame is not None, frame
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def get(self, prop):
+        return 0.0
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        if self._response is not None:
+            self._response.close()
+            self._response = None
+
+    def _next_part(self):
+        """Returns the JPEG bytes of the next part, None when the stream ends."""
+        headers = {}
+        # skip the boundary line, then read the part headers up to the blank line
+        while True:
+            line = self._response.readline(MAX_LINE)
+            if not line:
+                return None
+            line = line.strip()
+            if not line:
+                if headers:
+                    break
+                continue
+            if line.startswith(b"--"):
+                continue
+            name, _, value = line.partition(b":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = headers.get(b"content-length")
+        if length is not None:
+            data = self._response.read(int(length))
+            return data if len(data) == int(length) else None
+        # without a length the JPEG ends at its end-of-image marker
+        data = bytearray()
+        while not data.rstrip(b"\r\n").endswith(b"\xff\xd9"):
+            line = self._response.readline()
+            if not line:
+                return None
+            data += line
+        return bytes(data.rstrip(b"\r\n"))
+
+
+def open_stream(url, timeout=READ_TIMEOUT):
+    """Opens a network stream, MJPEG over HTTP(S) with MjpegCapture and anything else with FFmpeg."""
+    scheme = urllib.parse.urlparse(url).scheme.lower()
+    if scheme in ("http", "https"):
+        return MjpegCapture(url, timeout)
+    # OpenCV only takes FFmpeg options from the environment, they are set for this open only
+    # so other captures of the process don't get them. Options the user set win.
+    with _ffmpeg_options_lock:
+        own = FFMPEG_OPTIONS_VAR not in os.environ
+        if own:
+            os.environ[FFMPEG_OPTIONS_VAR] = FFMPEG_OPTIONS
+        try:
+            cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG, [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(OPEN_TIMEOUT * 1000),
+                                                         cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(timeout * 1000)])
+        finally:
+            if own:
+                del os.environ[FFMPEG_OPTIONS_VAR]
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+
+def is_stream(spec):
+    return "://" in str(spec)
+
+
+def open_source(spec, **options):
+    """Returns a FrameSource for a camera index, a stream URL or a video file.
+
+    options (loop, realtime) are passed to the FrameSource of a video file.
+    """
+    spec = str(spec)
+    if spec.isdigit():
+        return FrameSource(cv2.VideoCapture(int(spec)))
+    if is_stream(spec):
+        return NetworkSource(spec)
+    return FrameSource(cv2.VideoCapture(spec), **options)
+
+
+class Subscription:
+    """One consumer's view of a FrameSource with the parts of the VideoCapture API the app uses.
+
+    grab() waits for a frame newer than the last one this subscriber saw, frames that
+    arrived in between are skipped and counted in `missed`. While a NetworkSource
+    reconnects, grab() keeps waiting. It reports itself as a live
+    stream (no frame count), so FrameSampler samples it on the wall clock.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.missed = 0
+        self._seen = -1
+        self._frame = None
+        self._open = True
+
+    def isOpened(self):
+        return self._open and (self.source.alive or self.source.latest()[0] > self._seen)
+
+    def grab(self):
+        if not self._open:
+            return False
+        while True:
+            index, frame = self.source.wait_newer(self._seen, self.source.grab_timeout, cancelled=lambda: not self._open)
+            # a network source that is reconnecting is waited for
+            if frame is not None or not self._open or not self.source.reconnecting:
+                break
+        if frame is None:
+            return False
+        if self._seen >= 0:
+            self.missed += index - self._seen - 1
+        self._seen = index
+        self._frame = frame
+        return True
+
+    def retrieve(self):
+        return self._frame is not None, self._frame
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.source.fps
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self._seen + 1
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return 0
+        return self.source.cap.get(prop)
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        """Unsubscribes, a grab() waiting in another thread returns False."""
+        self._open = False
+        self.source.unsubscribe(self)
@@ -0,0 +1,46 @@
+import queue
+import threading
+
+#---------------------------------------------------------------#
+# Threaded stages
+#---------------------------------------------------------------#
+class ThreadedStages:
+    """Stop and error handling shared by processors that run their stages on several threads.
+
+    should_stop is polled by the stages, stop() makes it return True. The first
+    exception raised on any stage is kept and aborts all of them, run() re-raises it
+    once the threads are joined. The queue helpers block like put/get but give up
+    once the processor is aborted, so no stage waits forever on a dead neighbour.
+    """
+
+    def __init__(self, should_stop=None):
+        self.should_stop = should_stop
+        self._abort = threading.Event()
+        self._error = None
+
+    def _stopped(self):
+        return self._abort.is_set() or (self.should_stop is not None and self.should_stop())
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._abort.set()
+
+    def _put(self, q, item):
+        """Blocking put that gives up once the processor is aborted."""
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        """Blocking get that returns None once the processor is aborted."""
+        while not self._abort.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
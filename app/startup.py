@@ -0,0 +1,71 @@
+import builtins
+import os
+import sys
+import threading
+import time
+
+# set DONT_BLINK_STARTUP_REPORT to print which imports the startup time went to
+STARTUP_REPORT = bool(os.environ.get("DONT_BLINK_STARTUP_REPORT"))
+SLOWEST_IMPORTS = 15   # imports listed in the report
+
+#---------------------------------------------------------------#
+# Startup timer
+#---------------------------------------------------------------#
+class StartupTimer:
+    """Measures the time from launch to a usable window and what the imports cost.
+
+    mark() records a named point in time since the timer was created. While
+    track_imports() is on, every module imported for the first time by a top-level
+    import statement is timed, including the modules it imports itself, so the
+    report shows which of the app's imports are expensive. Imports on other threads
+    (the model warm-up) are not counted.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks = []
+        self.imports = {}
+        self._import = None
+        self._thread = None
+        self._depth = 0
+
+    def track_imports(self):
+        """Starts timing imports made on this thread, returns self."""
+        if self._import is None:
+            self._import = builtins.__import__
+            self._thread = threading.get_ident()
+            builtins.__import__ = self._timed_import
+        return self
+
+    def stop_tracking(self):
+        if self._import is not None:
+            builtins.__import__ = self._import
+            self._import = None
+
+    def mark(self, name):
+        """Records that name was reached, returns the seconds since launch."""
+        seconds = time.perf_counter() - self.start
+        self.marks.append((name, seconds))
+        return seconds
+
+    def report(self, slowest=SLOWEST_IMPORTS):
+        """Returns the marks and the slowest imports as lines of text."""
+        lines = [f"{name}: {seconds * 1000:.0f} ms" for name, seconds in self.marks]
+        imports = sorted(self.imports.items(), key=lambda item: item[1], reverse=True)
+        if imports:
+            total = sum(self.imports.values())
+            lines.append(f"imports: {total * 1000:.0f} ms in {len(imports)} modules")
+            lines += [f"  {name}: {seconds * 1000:.1f} ms" for name, seconds in imports[:slowest]]
+        return lines
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # only the outermost import of a new module is timed, nested ones count towards it
+        if (self._depth or level or name in sys.modules or threading.get_ident() != self._thread):
+            return self._import(name, globals, locals, fromlist, level)
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            self._depth -= 1
+            self.imports[name] = self.imports.get(name, 0.0) + time.perf_counter() - start
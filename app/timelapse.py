@@ -0,0 +1,441 @@
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from manifest import read_manifest
+from writer import PHOTO_EXTENSIONS
+
+TIMELAPSE_FPS = 15
+TIMELAPSE_NAME = "timelapse.mp4"
+SEGMENT_FOLDER = "timelapse_segments"
+SEGMENT_FRAMES = 150  # 10 seconds of timelapse at 15 fps
+
+ENCODERS = ("opencv", "ffmpeg")
+CRF = 23              # x264 quality, lower is better and larger
+PRESET = "faster"     # x264 speed/size trade-off
+
+_DONE = object()
+
+#---------------------------------------------------------------#
+# Encoders
+#---------------------------------------------------------------#
+def find_ffmpeg():
+    """Returns the path of the ffmpeg executable, or None if it isn't installed."""
+    return shutil.which("ffmpeg")
+
+
+def default_encoder():
+    """ffmpeg if it is installed, OpenCV otherwise."""
+    return "ffmpeg" if find_ffmpeg() else "opencv"
+
+
+class FfmpegWriter:
+    """Pipes raw BGR frames into ffmpeg/libx264, with the write/release API of cv2.VideoWriter.
+
+    size is the size of the frames written, output_size an optional size of the video.
+    """
+
+    def __init__(self, path, fps, size, crf=CRF, output_size=None, threads=0):
+        self.path = path
+        self.size = size
+        command = [find_ffmpeg() or "ffmpeg", "-y", "-loglevel", "error",
+                   "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{size[0]}x{size[1]}", "-r", str(fps),
+                   "-i", "-"]
+        command += _x264_args(crf, output_size, threads) + [path]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def isOpened(self):
+        return self._process.poll() is None
+
+    def write(self, frame):
+        self._process.stdin.write(frame.tobytes())
+
+    def release(self):
+        if self._process.stdin.closed:
+            return
+        self._process.stdin.close()
+        error = self._process.stderr.read().decode(errors="replace").strip()
+        if self._process.wait() != 0:
+            raise IOError(f"ffmpeg failed to write {self.path}: {error}")
+
+
+def _x264_args(crf, output_size, threads):
+    # libx264 with yuv420p needs even dimensions
+    if output_size is not None:
+        scale = f"scale={output_size[0]}:{output_size[1]}"
+    else:
+        scale = "scale=trunc(iw/2)*2:trunc(ih/2)*2"
+    return ["-vf", scale, "-c:v", "libx264", "-preset", PRESET, "-crf", str(crf), "-pix_fmt", "yuv420p",
+            "-threads", str(threads), "-movflags", "+faststart"]
+
+
+def _open_writer(path, fps, size, encoder="opencv", crf=CRF):
+    if encoder == "ffmpeg":
+        out = FfmpegWriter(path, fps, size, crf=crf)
+    elif encoder == "opencv":
+        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+        out = cv2.VideoWriter(path, fourcc, fps, size)
+    else:
+        raise ValueError(f"Unknown encoder '{encoder}', expected one of {', '.join(ENCODERS)}")
+    if not out.isOpened():
+        raise IOError(f"Could not open video writer for {path}")
+    return out
+
+
+def _concat(paths, video_path):
+    """Joins videos with identical encoding settings into video_path without re-encoding."""
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+        list_path = f.name
+    try:
+        subprocess.run([find_ffmpeg() or "ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                        "-i", list_path, "-c", "copy", "-movflags", "+faststart", video_path],
+                       check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        raise IOError(f"ffmpeg could not join the videos: {e.stderr.decode(errors='replace').strip()}")
+    finally:
+        os.remove(list_path)
+
+#---------------------------------------------------------------#
+# Live timelapse
+#---------------------------------------------------------------#
+class TimelapseWriter:
+    """Appends captured frames to the session's timelapse while processing runs.
+
+    Frames are encoded on a background thread in the order add() was called, so the
+    caller never waits for the encoder. Besides timelapse.mp4 every frame also goes into
+    short segment files that are closed every `segment_frames` frames. An MP4 is only
+    readable once it is closed, so if the process dies the closed segments still hold
+    all but the last few seconds and join_segments() can stitch them together. After a
+    clean close() the segments are deleted. Captures are rare (about one per layer), so
+    encoding every frame twice costs next to nothing.
+    """
+
+    def __init__(self, session_folder, fps=TIMELAPSE_FPS, segment_frames=SEGMENT_FRAMES, encoder="opencv",
+                 crf=CRF):
+        self.session_folder = session_folder
+        self.video_path = os.path.join(session_folder, TIMELAPSE_NAME)
+        self.segment_folder = os.path.join(session_folder, SEGMENT_FOLDER)
+        self.fps = fps
+        self.segment_frames = segment_frames
+        self.encoder = encoder
+        self.crf = crf
+        self.frames = 0
+
+        self._size = None
+        self._video = None
+        self._segment = None
+        self._segment_index = 0
+        self._segment_count = 0
+        self._error = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="timelapse-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, frame):
+        """Queues a frame for the timelapse. The frame must not be modified afterwards."""
+        self._queue.put(frame)
+
+    def close(self):
+        """Finishes the video and returns its path, or None if no frame was added."""
+        self._queue.put(_DONE)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        if self._video is None:
+            return None
+        shutil.rmtree(self.segment_folder, ignore_errors=True)
+        return self.video_path
+
+    def _run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is _DONE:
+                break
+            if self._error is not None:
+                continue
+            try:
+                self._write(frame)
+            except Exception as e:
+                self._error = e
+        for out in (self._video, self._segment):
+            if out is None:
+                continue
+            try:
+                out.release()
+            except Exception as e:
+                self._error = self._error or e
+
+    def _open(self, path):
+        return _open_writer(path, self.fps, self._size, self.encoder, self.crf)
+
+    def _write(self, frame):
+        if self._size is None:
+            h, w = frame.shape[:2]
+            self._size = (w, h)
+            os.makedirs(self.segment_folder, exist_ok=True)
+            self._video = self._open(self.video_path)
+        if frame.shape[1::-1] != self._size:
+            frame = cv2.resize(frame, self._size)
+
+        if self._segment is None:
+            self._segment_index += 1
+            self._segment = self._open(os.path.join(self.segment_folder, f"segment_{self._segment_index:05d}.mp4"))
+            self._segment_count = 0
+
+        self._video.write(frame)
+        self._segment.write(frame)
+        self.frames += 1
+        self._segment_count += 1
+        if self._segment_count >= self.segment_frames:
+            self._segment.release()
+            self._segment = None
+
+#---------------------------------------------------------------#
+# Post-hoc timelapse
+#---------------------------------------------------------------#
+def find_frames(frames_path):
+    """Returns the captured photos of a session folder in capture order.
+
+    The order comes from the session manifest. Sessions recorded before there was a
+    manifest fall back to listing the folder and sorting the frame numbers.
+    """
+    entries = read_manifest(frames_path)
+    if entries is not None:
+        return [entry["path"] for entry in entries]
+    from natsort import natsorted
+
+    images = [img for img in os.listdir(frames_path) if img.lower().endswith(PHOTO_EXTENSIONS)]
+    return natsorted(images)
+
+
+def has_segments(session_folder):
+    """Tells whether a live timelapse was left unfinished in session_folder."""
+    segment_folder = os.path.join(session_folder, SEGMENT_FOLDER)
+    return os.path.isdir(segment_folder) and any(name.endswith(".mp4") for name in os.listdir(segment_folder))
+
+
+def join_segments(session_folder, fps=TIMELAPSE_FPS, progress=None, should_stop=None):
+    """Stitches the segments of an unfinished live timelapse into timelapse.mp4.
+
+    With ffmpeg installed the segments are joined without re-encoding. The segments are
+    deleted once the video is complete, a join that fails or is stopped keeps them.
+    Returns the path of the video and the number of frames written.
+    """
+    from natsort import natsorted
+
+    segment_folder = os.path.join(session_folder, SEGMENT_FOLDER)
+    segments = natsorted(name for name in os.listdir(segment_folder) if name.endswith(".mp4"))
+    paths = [os.path.join(segment_folder, name) for name in segments]
+    video_path = os.path.join(session_folder, TIMELAPSE_NAME)
+    total = sum(_frame_count(path) for path in paths)
+
+    if find_ffmpeg():
+        # the last segment may be cut off if the process died while writing it
+        readable = [path for path in paths if _frame_count(path) > 0]
+        _concat(readable, video_path)
+        if progress is not None:
+            progress(total, total)
+        result = video_path, total
+    else:
+        result = _encode(_read_videos(paths), video_path, fps, total, progress, should_stop)
+        # a cancelled join leaves a cut-off video, the segments are kept to join them again
+        if should_stop is not None and should_stop():
+            return result
+    # only reached once _concat or _encode finished the whole video
+    shutil.rmtree(segment_folder, ignore_errors=True)
+    return result
+
+
+def build_timelapse(frames_path, fps=TIMELAPSE_FPS, progress=None, should_stop=None, encoder="opencv",
+                    crf=CRF, size=None, workers=None):
+    """Encodes all captured photos of a session folder into timelapse.mp4.
+
+    progress(done, total) is called after every frame. The ffmpeg encoder hands JPEG
+    files to ffmpeg without decoding them in Python, encodes `workers` chunks of the list
+    in parallel and joins them without re-encoding. PNG and WebP photos are decoded here
+    and piped to ffmpeg as raw frames. size is an optional (width, height)
+    of the video. Returns the path of the video and the number of frames written, raises
+    ValueError if there is nothing to encode.
+    """
+    images = find_frames(frames_path)
+    if not images:
+        raise ValueError("No images found in the session folder to create a timelapse.")
+    paths = [os.path.join(frames_path, image) for image in images]
+    video_path = os.path.join(frames_path, TIMELAPSE_NAME)
+    if encoder == "ffmpeg" and all(path.lower().endswith((".jpg", ".jpeg")) for path in paths):
+        return _encode_jpegs(paths, video_path, fps, crf, size, workers, progress, should_stop)
+    return _encode(_read_images(paths), video_path, fps, len(paths), progress, should_stop, size, encoder, crf)
+
+
+def _frame_count(path):
+    cap = cv2.VideoCapture(path)
+    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return max(count, 0)
+
+
+def _read_images(paths):
+    for path in paths:
+        frame = cv2.imread(path)
+        if frame is None:
+            print(f"Warning: Skipping unreadable image {os.path.basename(path)}")
+        yield frame
+
+
+def _read_videos(paths):
+    for path in paths:
+        cap = cv2.VideoCapture(path)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+        cap.release()
+
+
+def _encode(frames, video_path, fps, total, progress, should_stop, size=None, encoder="opencv", crf=CRF):
+    """Writes frames (None for unreadable ones) with OpenCV, returns the path and frames written."""
+    out = None
+    count = 0
+    done = 0
+    try:
+        for frame in frames:
+            if should_stop is not None and should_stop():
+                break
+            if frame is not None:
+                if out is None:
+                    if size is None:
+                        h, w = frame.shape[:2]
+                        size = (w, h)
+                    out = _open_writer(video_path, fps, size, encoder, crf)
+                if frame.shape[1::-1] != tuple(size):
+                    frame = cv2.resize(frame, tuple(size), interpolation=cv2.INTER_AREA)
+                out.write(frame)
+                count += 1
+            done += 1
+            if progress is not None:
+                progress(done, max(total, done))
+    finally:
+        if out is not None:
+            out.release()
+    if out is None:
+        raise ValueError("Could not read any frame to create a timelapse.")
+    return video_path, count
+
+
+def _encode_jpegs(paths, video_path, fps, crf, size, workers, progress, should_stop):
+    """Encodes chunks of the JPEG list with parallel ffmpeg processes and joins the parts."""
+    workers = max(1, min(workers or os.cpu_count() or 1, len(paths)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    chunk = -(-len(paths) // workers)
+    chunks = [paths[i:i + chunk] for i in range(0, len(paths), chunk)]
+
+    lock = threading.Lock()
+    done = [0]
+
+    def advance():
+        with lock:
+            done[0] += 1
+            if progress is not None:
+                progress(done[0], len(paths))
+
+    part_folder = tempfile.mkdtemp(prefix="timelapse_", dir=os.path.dirname(video_path))
+    try:
+        parts = [os.path.join(part_folder, f"part_{i:03d}.mp4") for i in range(len(chunks))]
+        with ThreadPoolExecutor(len(chunks)) as pool:
+            for part in pool.map(lambda job: _encode_jpeg_chunk(*job, fps, crf, size, threads, advance, should_stop),
+                                 zip(chunks, parts)):
+                pass
+        if should_stop is not None and should_stop():
+            raise ValueError("Timelapse creation was cancelled.")
+        if len(parts) == 1:
+            os.replace(parts[0], video_path)
+        else:
+            _concat(parts, video_path)
+    finally:
+        shutil.rmtree(part_folder, ignore_errors=True)
+    return video_path, len(paths)
+
+
+def _encode_jpeg_chunk(paths, part_path, fps, crf, size, threads, advance, should_stop):
+    command = [find_ffmpeg() or "ffmpeg", "-y", "-loglevel", "error",
+               "-f", "image2pipe", "-c:v", "mjpeg", "-framerate", str(fps), "-i", "-"]
+    command += _x264_args(crf, size, threads) + [part_path]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        for path in paths:
+            if should_stop is not None and should_stop():
+                process.kill()
+                break
+            try:
+                with open(path, "rb") as f:
+                    process.stdin.write(f.read())
+            except FileNotFoundError:
+                print(f"Warning: Skipping missing image {os.path.basename(path)}")
+            advance()
+    finally:
+        if not process.stdin.closed:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+        error = process.stderr.read().decode(errors="replace").strip()
+        returncode = process.wait()
+    if returncode != 0 and not (should_stop is not None and should_stop()):
+        raise IOError(f"ffmpeg failed to encode the timelapse: {error}")
+    return part_path
+
+#---------------------------------------------------------------#
+# Benchmark
+#---------------------------------------------------------------#
+def compare_encoders(frames_path, fps=TIMELAPSE_FPS, crf=CRF, size=None, workers=None):
+    """Builds the timelapse of a session with both encoders and prints wall time and file size."""
+    report = []
+    encoders = ["opencv"] + (["ffmpeg"] if find_ffmpeg() else [])
+    for encoder in encoders:
+        start = time.perf_counter()
+        video_path, count = build_timelapse(frames_path, fps=fps, encoder=encoder, crf=crf, size=size,
+                                            workers=workers)
+        seconds = time.perf_counter() - start
+        megabytes = os.path.getsize(video_path) / 1e6
+        print(f"📊 {encoder}: {count} frames in {seconds:.1f}s ({count / seconds:.1f} fps), {megabytes:.1f} MB")
+        report.append({"encoder": encoder, "frames": count, "seconds": seconds, "megabytes": megabytes})
+    if len(encoders) == 1:
+        print("⚠️ ffmpeg not found, only OpenCV was measured.")
+    return report
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Create the timelapse of a session folder.")
+    parser.add_argument("session", help="session folder with the captured frames")
+    parser.add_argument("--encoder", choices=ENCODERS, default=default_encoder())
+    parser.add_argument("--fps", type=float, default=TIMELAPSE_FPS)
+    parser.add_argument("--crf", type=int, default=CRF, help="x264 quality (ffmpeg only)")
+    parser.add_argument("--size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"), help="output resolution")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="parallel ffmpeg processes")
+    parser.add_argument("--benchmark", action="store_true", help="compare the OpenCV and ffmpeg encoders")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        compare_encoders(args.session, fps=args.fps, crf=args.crf, size=args.size, workers=args.workers)
+        return 0
+    video_path, count = build_timelapse(args.session, fps=args.fps, encoder=args.encoder, crf=args.crf,
+                                        size=args.size, workers=args.workers)
+    print(f"✅ {count} frames saved as {video_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import sys
+from collections import namedtuple
+
+LATEST_VERSION_URL = os.environ.get("DONT_BLINK_UPDATE_URL",
+                                    "https://smoothyy3.github.io/Dont-Blink/latest_version.txt")
+TIMEOUT = (5, 30)   # seconds to connect and between two received chunks
+CHUNK_SIZE = 1 << 16
+
+# latest_version.txt holds the version, the download URL and "sha256=<hex digest>" of the download
+UpdateInfo = namedtuple("UpdateInfo", ["version", "url", "sha256"])
+
+
+class UpdateError(Exception):
+    pass
+
+#---------------------------------------------------------------#
+# Version check
+#---------------------------------------------------------------#
+def current_version(default="Unknown"):
+    """Returns the version in version.txt next to the app, or default if there is none."""
+    if getattr(sys, 'frozen', False):
+        base_path = sys._MEIPASS  # PyInstaller temp extraction folder
+    else:
+        base_path = os.path.dirname(os.path.abspath(__file__))  # Running from source
+    path = os.path.join(base_path, "version.txt")
+    if not os.path.exists(path):
+        return default
+    with open(path, "r") as f:
+        return f.read().strip()
+
+
+def fetch_update_info(url=LATEST_VERSION_URL, timeout=TIMEOUT):
+    """Downloads and parses latest_version.txt."""
+    # requests takes a while to import, it is only loaded once the network is needed
+    import requests
+
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return parse_update_info(response.text)
+
+
+def parse_update_info(text):
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if len(lines) < 2:
+        raise UpdateError("The version file needs a version and a download URL")
+    sha256 = None
+    for line in lines[2:]:
+        if line.lower().startswith("sha256="):
+            sha256 = line.split("=", 1)[1].strip().lower()
+    return UpdateInfo(lines[0], lines[1], sha256)
+
+
+def is_newer(latest, current):
+    from packaging import version
+
+    return version.parse(latest) > version.parse(current)
+
+#---------------------------------------------------------------#
+# Download
+#---------------------------------------------------------------#
+def download(url, path, sha256, progress=None, should_stop=None, timeout=TIMEOUT, part_path=None):
+    """Downloads url to path, resuming an earlier partial download, and returns path.
+
+    The data goes to part_path (path + ".part" by default) first. If that file exists,
+    only the missing bytes are requested with an HTTP Range header; a server that
+    ignores the range sends everything again and the file is restarted. progress(done,
+    total) is called per chunk, total is 0 if the server doesn't tell. The complete
+    file must match sha256, otherwise it is deleted and UpdateError is raised. Without
+    a sha256 nothing is downloaded. Only a complete, verified file is moved to path.
+    """
+    import requests
+
+    if not sha256:
+        raise UpdateError("The version file publishes no sha256, the update can't be verified")
+    part_path = part_path or path + ".part"
+    done = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={done}-"} if done else {}
+
+    with requests.get(url, stream=True, headers=headers, timeout=timeout) as response:
+        if done and response.status_code == 416 and done == content_range_total(response):
+            # the partial file already has every byte
+            pass
+        elif done and response.status_code == 416:
+            # the partial file doesn't belong to this download, start over
+            os.remove(part_path)
+            return download(url, path, sha256, progress, should_stop, timeout, part_path)
+        else:
+            response.raise_for_status()
+            if response.status_code != 206:
+                done = 0
+            total = done + int(response.headers.get("Content-Length", 0))
+            with open(part_path, "ab" if done else "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if should_stop is not None and should_stop():
+                        raise UpdateError("Download cancelled")
+                    f.write(chunk)
+                    done += len(chunk)
+                    if progress is not None:
+                        progress(done, max(total, done) if total else 0)
+
+    digest = file_sha256(part_path)
+    if digest != sha256.lower():
+        os.remove(part_path)
+        raise UpdateError(f"Checksum mismatch, expected {sha256} but got {digest}")
+    os.replace(part_path, path)
+    return path
+
+
+def content_range_total(response):
+    """Returns the full size from a "bytes */<size>" Content-Range header, or None."""
+    total = response.headers.get("Content-Range", "").rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
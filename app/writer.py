@@ -0,0 +1,243 @@
+import collections
+import mmap
+import os
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from metrics import StageStats
+
+# extension and the OpenCV quality flag of every photo format, PNG is always lossless
+FORMATS = {
+    "jpg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "png": (".png", None),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+QUALITY = 95          # JPEG/WebP quality (1-100), 95 is what cv2.imwrite used
+PNG_COMPRESSION = 1   # zlib level 0-9, low levels are much faster for camera frames
+QUEUE_SIZE = 8        # photos waiting in memory
+WRITERS = 2
+
+# a frame chosen by the capture policy, box is the normalized (x, y, w, h) that triggered it
+Capture = collections.namedtuple("Capture", ["frame_count", "frame", "box", "conf"])
+
+#---------------------------------------------------------------#
+# Photo writer
+#---------------------------------------------------------------#
+class PhotoWriter:
+    """Saves captured frames to a session folder on background threads.
+
+    write() hands a Capture over and returns right away, so a slow SD card or network
+    share doesn't hold up detection. Every photo is encoded in memory, written to a
+    temporary file and renamed, so the folder never contains half-written photos, then
+    recorded in manifest (a SessionManifest) if one is set.
+
+    Up to queue_size photos wait in memory. With spill_frames > 0, photos beyond that
+    are copied into a memory-mapped spill file of spill_frames raw frames, which the
+    OS can page out instead of holding them in RAM, so a burst or a stalled disk
+    doesn't block the caller. Only when both are full does write() wait.
+    """
+
+    def __init__(self, folder, fmt="jpg", quality=QUALITY, queue_size=QUEUE_SIZE, workers=WRITERS,
+                 spill_frames=0, manifest=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown photo format '{fmt}', expected one of {', '.join(FORMATS)}")
+        self.folder = folder
+        self.format = fmt
+        self.quality = quality
+        self.queue_size = queue_size
+        self.workers = workers
+        self.spill_frames = spill_frames
+        self.manifest = manifest
+        self.extension, flag = FORMATS[fmt]
+        if flag is None:
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION]
+        else:
+            self.params = [flag, int(quality)]
+
+        self.stages = {"queue": StageStats(), "write": StageStats()}
+        self.written = 0
+        self.bytes = 0
+        self.spilled = 0
+
+        self._items = collections.deque()
+        self._in_memory = 0
+        self._busy = 0
+        self._spill = None
+        self._cond = threading.Condition()
+        self._closing = False
+        self._error = None
+        self._threads = []
+        self._start = None
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._threads = [threading.Thread(target=self._write_loop, name=f"photo-writer-{i}", daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def write(self, capture):
+        """Queues a Capture to be saved, waits only if both the queue and the spill file are full."""
+        queued = time.perf_counter()
+        timestamp = time.time()
+        slot = None
+        with self._cond:
+            while True:
+                self._raise_error()
+                if self._in_memory < self.queue_size:
+                    self._in_memory += 1
+                    self._items.append((capture, None, queued, timestamp))
+                    self._cond.notify()
+                    return
+                if self.spill_frames:
+                    slot = self._spill_slot(capture.frame)
+                    if slot is not None:
+                        break
+                self._cond.wait()
+        # the copy into the spill file happens outside the lock, the writers keep going
+        self._spill.frames[slot] = capture.frame
+        with self._cond:
+            self.spilled += 1
+            self._items.append((capture._replace(frame=None), slot, queued, timestamp))
+            self._cond.notify()
+
+    def drain(self):
+        """Waits until every photo queued so far is saved."""
+        with self._cond:
+            self._cond.wait_for(lambda: (not self._items and not self._busy) or self._error is not None)
+            self._raise_error()
+
+    def close(self):
+        """Waits for every queued photo to be saved and stops the writer threads."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        self._raise_error()
+
+    def pending(self):
+        """Returns the number of photos not saved yet."""
+        with self._cond:
+            return len(self._items)
+
+    def stats(self):
+        """Returns photos and bytes written, throughput, photos spilled and waiting, and the time per stage."""
+        seconds = time.perf_counter() - self._start if self._start else 0.0
+        return {
+            "format": self.format,
+            "written": self.written,
+            "bytes": self.bytes,
+            "spilled": self.spilled,
+            "pending": self.pending(),
+            "photos_per_second": self.written / seconds if seconds else 0.0,
+            "mb_per_second": self.bytes / seconds / 1e6 if seconds else 0.0,
+            "stages": {name: stage.summary() for name, stage in self.stages.items()},
+        }
+
+    def photo_name(self, frame_count):
+        return f"frame_{frame_count}{self.extension}"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    #---------------------------------------------------------------#
+    # Writer threads
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._items or self._closing)
+                if not self._items:
+                    return
+                capture, slot, queued, timestamp = self._items.popleft()
+                self._busy += 1
+            self.stages["queue"].add(time.perf_counter() - queued)
+            try:
+                frame = capture.frame if slot is None else self._spill.frames[slot]
+                self._save(capture, frame, timestamp)
+            except Exception as e:
+                with self._cond:
+                    if self._error is None:
+                        self._error = e
+            finally:
+                with self._cond:
+                    self._busy -= 1
+                    if slot is None:
+                        self._in_memory -= 1
+                    else:
+                        self._spill.release(slot)
+                    self._cond.notify_all()
+
+    def _save(self, capture, frame, timestamp):
+        start = time.perf_counter()
+        name = self.photo_name(capture.frame_count)
+        ok, data = cv2.imencode(self.extension, frame, self.params)
+        if not ok:
+            raise IOError(f"Could not encode {name}")
+        path = os.path.join(self.folder, name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        if self.manifest is not None:
+            self.manifest.add(capture.frame_count, name, capture.box, capture.conf, timestamp=timestamp)
+        self.stages["write"].add(time.perf_counter() - start)
+        with self._cond:
+            self.written += 1
+            self.bytes += len(data)
+
+    #---------------------------------------------------------------#
+    # Helpers
+
+    def _spill_slot(self, frame):
+        if self._spill is None:
+            self._spill = SpillFile(frame.shape, self.spill_frames)
+        elif self._spill.frames.shape[1:] != frame.shape:
+            return None
+        return self._spill.reserve()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+
+class SpillFile:
+    """A temporary file of `slots` raw frames of one shape, mapped into memory."""
+
+    def __init__(self, shape, slots):
+        fd, self.path = tempfile.mkstemp(prefix="dont-blink-spill-", suffix=".raw")
+        shape = (slots,) + tuple(shape)
+        self._file = os.fdopen(fd, "w+b")
+        self._file.truncate(int(np.prod(shape)))
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self.frames = np.ndarray(shape, dtype=np.uint8, buffer=self._mmap)
+        self._free = list(range(slots))
+
+    def reserve(self):
+        """Returns a free slot, or None if all are taken."""
+        return self._free.pop() if self._free else None
+
+    def release(self, slot):
+        self._free.append(slot)
+
+    def close(self):
+        self.frames = None
+        self._mmap.close()
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
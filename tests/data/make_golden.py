@@ -0,0 +1,76 @@
+"""Writes the synthetic golden trace and the photos every policy takes on it.
+
+Usage:
+    python tests/data/make_golden.py
+
+The trace is made up, not recorded with the model: a printhead (one box, y and size
+fixed) sweeps over the print, parks at the left edge between layers and sometimes
+isn't detected, once just after it parked. Some frames have a second, less
+confident box, a reflection on the right or a double detection of the head, and
+once the head leaves the frame to the right and comes back. Only run this when a change of the
+photos is intended, then review the diff of golden_captures.json.
+"""
+import os
+import sys
+
+import numpy as np
+
+DATA = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DATA, "..", "..", "app"))
+
+from policies import POLICIES, evaluate, make_policy  # noqa: E402
+from replay import DetectionTrace  # noqa: E402
+
+FRAME_STEP = 7.5      # video frames per sampled frame (30 fps, default interval)
+PARK_X = 0.075
+HEAD = (1 / 3, 0.1, 1 / 6)    # y, w, h of the printhead box
+REFLECTION_X = 0.85
+
+
+def head_positions():
+    """Returns the printhead x per sampled frame, NaN while it is out of the frame."""
+    positions = []
+    for layer in range(6):
+        positions += [0.35 + 0.05 * step for step in range(8)]
+        if layer == 3:
+            # leaves the frame to the right, stays away and comes back
+            positions += [0.8, 0.9, 0.97] + [np.nan] * 5 + [0.95, 0.85, 0.75]
+        positions += [0.7 - 0.05 * step for step in range(8)] + [0.3, 0.2] + [PARK_X] * 4
+    return positions
+
+
+def make_trace(seed=1):
+    rng = np.random.default_rng(seed)
+    y, w, h = HEAD
+    trace = DetectionTrace()
+    parked = 0
+    for sample, x in enumerate(head_positions()):
+        frame_index = round(sample * FRAME_STEP)
+        parked = parked + 1 if x == PARK_X else 0
+        boxes = []
+        # the moving head is missed now and then, a parked one once right after it arrived
+        missed = rng.random() < 0.04 if not parked else sample > 100 and parked == 2
+        if not np.isnan(x) and not missed:
+            boxes.append((x + rng.normal(0, 0.001), y, w, h, rng.uniform(0.6, 0.95)))
+            if rng.random() < 0.05:
+                # a second detection of the same head, slightly to the right
+                boxes.append((x + rng.uniform(0.003, 0.01), y, w, h, rng.uniform(0.3, 0.5)))
+        if 40 <= sample < 70:
+            boxes.append((REFLECTION_X + rng.normal(0, 0.001), 0.6, 0.05, 0.08, rng.uniform(0.3, 0.5)))
+        trace.add(frame_index, boxes)
+    return trace.array()
+
+
+def main():
+    trace = make_trace()
+    np.save(os.path.join(DATA, "golden_trace.npy"), trace)
+    captures = {name: [frame for frame, _ in evaluate(make_policy(name), trace)] for name in POLICIES}
+    with open(os.path.join(DATA, "golden_captures.json"), "w", encoding="utf-8") as f:
+        f.write("{\n" + ",\n".join(f'  "{name}": {frames}' for name, frames in captures.items()) + "\n}\n")
+    for name, frames in captures.items():
+        print(f"{name}: {frames}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""A local stand-in for a printer's MJPEG webcam stream (mjpg-streamer, OctoPrint, Klipper)."""
+import http.server
+import socketserver
+import threading
+import time
+
+import cv2
+import numpy as np
+
+BOUNDARY = b"frame"
+
+
+class MjpegServer:
+    """Serves a moving square as multipart/x-mixed-replace JPEG frames on 127.0.0.1.
+
+    Every connection gets fps frames a second. With drop_after, every connection is
+    closed after that many frames, like a camera that drops its clients. stop() closes
+    the listening socket and all connections, start() opens them again on the same
+    port, so a restart of the camera can be simulated.
+    """
+
+    def __init__(self, fps=30, drop_after=None, port=0):
+        self.fps = fps
+        self.drop_after = drop_after
+        self.port = port
+        self.connections = 0
+        self._server = None
+        self._stop = threading.Event()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/stream"
+
+    def start(self):
+        owner = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                owner.connections += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=" + BOUNDARY.decode())
+                self.end_headers()
+                sent = 0
+                try:
+                    while not owner._stop.is_set():
+                        data = frame_jpeg(sent)
+                        self.wfile.write(b"--" + BOUNDARY + b"\r\nContent-Type: image/jpeg\r\n"
+                                         + b"Content-Length: %d\r\n\r\n" % len(data) + data + b"\r\n")
+                        sent += 1
+                        if owner.drop_after is not None and sent >= owner.drop_after:
+                            return
+                        time.sleep(1 / owner.fps)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+            daemon_threads = True
+            block_on_close = True
+
+        self._stop.clear()
+        self._server = Server(("127.0.0.1", self.port), Handler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._stop.set()
+            self._server.shutdown()
+            # waits for the open connections to end
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def frame_jpeg(index, size=(320, 180)):
+    """Returns frame index of the stream as JPEG bytes."""
+    width, height = size
+    frame = np.full((height, width, 3), 40, np.uint8)
+    x = 20 + index * 4 % (width - 70)
+    cv2.rectangle(frame, (x, 60), (x + 30, 90), (0, 0, 255), -1)
+    return cv2.imencode(".jpg", frame)[1].tobytes()
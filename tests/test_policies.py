@@ -0,0 +1,72 @@
+"""Golden tests: every capture policy against a synthetic detection trace.
+
+data/golden_trace.npy is written by data/make_golden.py: a printhead that sweeps,
+parks at the left edge, is missed now and then, has a second box in some frames and
+leaves the frame once. golden_captures.json holds the frames each policy took on it.
+A change that moves a photo shows up here.
+"""
+import json
+import os
+
+import numpy as np
+import pytest
+
+from policies import (MATCHES, POLICIES, WIGGLE_ROOM, StillnessPolicy, evaluate, make_policy,
+                      trace_frames)
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+@pytest.fixture(scope="module")
+def trace():
+    return np.load(os.path.join(DATA, "golden_trace.npy"))
+
+
+@pytest.fixture(scope="module")
+def golden():
+    with open(os.path.join(DATA, "golden_captures.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_every_policy_has_golden_frames(golden):
+    assert sorted(golden) == sorted(POLICIES)
+
+
+@pytest.mark.parametrize("name", list(POLICIES))
+def test_policy_matches_golden(trace, golden, name):
+    assert [frame for frame, _ in evaluate(make_policy(name), trace)] == golden[name]
+
+
+def test_vectorized_replay_matches_golden(trace, golden):
+    valid = ~np.isnan(trace["x"])
+    replayed = StillnessPolicy.replay(trace["x"][valid], [WIGGLE_ROOM], [MATCHES])[0]
+    assert np.unique(trace["frame"][valid][replayed]).tolist() == golden["stillness"]
+
+
+@pytest.mark.parametrize("name", list(POLICIES))
+def test_saved_state_continues_like_an_uninterrupted_run(trace, golden, name):
+    # split at the first row of the middle frame, the way a checkpoint splits a run
+    split = int(np.searchsorted(trace["frame"], trace["frame"][len(trace) // 2]))
+    first = make_policy(name)
+    frames = [frame for frame, _ in evaluate(first, trace[:split])]
+    second = make_policy(name)
+    second.load_state(json.loads(json.dumps(first.save_state())))
+    frames += [frame for frame, boxes in trace_frames(trace[split:]) if second.update(boxes)]
+    assert frames == golden[name]
+
+
+def boxes_at(*xs):
+    """One frame's boxes, a box per x with the size and confidence of the synthetic printhead."""
+    return np.array([[x, 0.33, 0.1, 0.17, 0.8] for x in xs]).reshape(-1, 5)
+
+
+def test_kalman_one_miss_while_parked_at_the_edge_is_no_exit():
+    policy = make_policy("kalman-exit")
+    frames = [boxes_at(x) for x in (0.5, 0.44, 0.39, 0.075)] + [boxes_at(), boxes_at(0.076), boxes_at(0.075)]
+    assert not any(policy.update(boxes) for boxes in frames)
+
+
+def test_kalman_head_leaving_the_frame_is_one_exit():
+    policy = make_policy("kalman-exit")
+    frames = [boxes_at(x) for x in (0.4, 0.3, 0.2, 0.1, 0.02)] + [boxes_at()] * 4
+    assert [policy.update(boxes) for boxes in frames] == [False] * 6 + [True, False, False]
@@ -0,0 +1,84 @@
+"""NetworkSource against a local MJPEG stand-in server."""
+import os
+import time
+
+import pytest
+
+import sources
+from mjpeg_server import MjpegServer
+from sources import NetworkSource
+
+READ_TIMEOUT = 1.0
+
+
+@pytest.fixture(autouse=True)
+def fast_reconnect(monkeypatch):
+    monkeypatch.setattr(sources, "RECONNECT_DELAY", 0.05)
+
+
+def grab_for(subscription, seconds, pause=0.0):
+    """Grabs for the given time, returns the number of frames grabbed."""
+    grabbed = 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        assert subscription.grab()
+        grabbed += 1
+        time.sleep(pause)
+    return grabbed
+
+
+def test_slow_consumer_gets_the_latest_frame():
+    with MjpegServer(fps=30) as server:
+        source = NetworkSource(server.url, READ_TIMEOUT)
+        try:
+            subscription = source.subscribe()
+            grabbed = grab_for(subscription, 2.0, pause=0.2)
+            # the reader kept up with the stream while the consumer skipped the frames in between
+            assert source.frames_read > 3 * grabbed
+            assert subscription.missed > 0
+            assert source.latency.summary()["avg_ms"] < 100
+        finally:
+            source.stop()
+
+
+def test_dropped_connection_is_reconnected():
+    with MjpegServer(fps=30, drop_after=10) as server:
+        source = NetworkSource(server.url, READ_TIMEOUT)
+        try:
+            subscription = source.subscribe()
+            grab_for(subscription, 2.0)
+            assert source.reconnects >= 1
+            assert server.connections == source.reconnects + 1
+            assert source.alive
+        finally:
+            source.stop()
+
+
+def test_server_restart_is_waited_for():
+    server = MjpegServer(fps=30).start()
+    source = NetworkSource(server.url, READ_TIMEOUT)
+    try:
+        subscription = source.subscribe()
+        grab_for(subscription, 0.5)
+        server.stop()
+        time.sleep(0.5)
+        assert source.reconnecting and source.alive
+        server.start()
+        # grab() waits for the reconnect instead of ending the stream
+        assert subscription.grab()
+        assert source.reconnects == 1
+        grab_for(subscription, 0.5)
+    finally:
+        source.stop()
+        server.stop()
+
+
+def test_ffmpeg_options_are_only_set_while_a_stream_opens(monkeypatch):
+    monkeypatch.delenv(sources.FFMPEG_OPTIONS_VAR, raising=False)
+    cap = sources.open_stream("rtsp://127.0.0.1:1/stream", 0.5)
+    assert not cap.isOpened()
+    assert sources.FFMPEG_OPTIONS_VAR not in os.environ
+
+    monkeypatch.setenv(sources.FFMPEG_OPTIONS_VAR, "rtsp_transport;udp")
+    sources.open_stream("rtsp://127.0.0.1:1/stream", 0.5)
+    assert os.environ[sources.FFMPEG_OPTIONS_VAR] == "rtsp_transport;udp"
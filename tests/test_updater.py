@@ -0,0 +1,119 @@
+"""download() against a local HTTP server with Range support."""
+import hashlib
+import http.server
+import os
+import socketserver
+import threading
+
+import pytest
+
+from updater import UpdateError, download
+
+PAYLOAD = os.urandom(300_000)
+SHA256 = hashlib.sha256(PAYLOAD).hexdigest()
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    ranges = True   # False answers every request with the whole file
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        header = self.headers.get("Range")
+        type(self).requests.append(header)
+        start = int(header[len("bytes="):].rstrip("-")) if header and self.ranges else 0
+        if start >= len(PAYLOAD):
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{len(PAYLOAD)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}")
+        self.send_header("Content-Length", str(len(PAYLOAD) - start))
+        self.end_headers()
+        self.wfile.write(PAYLOAD[start:])
+
+
+@pytest.fixture
+def server():
+    handler = type("TestHandler", (Handler,), {"requests": []})
+    httpd = socketserver.ThreadingTCPServer(("127.0.0.1", 0), handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    handler.url = f"http://127.0.0.1:{httpd.server_address[1]}/Dont-Blink.exe"
+    yield handler
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_download_verifies_and_installs(server, tmp_path):
+    path = str(tmp_path / "app.exe")
+    progress = []
+    assert download(server.url, path, SHA256, progress=lambda done, total: progress.append((done, total))) == path
+    assert read(path) == PAYLOAD
+    assert progress[-1] == (len(PAYLOAD), len(PAYLOAD))
+    assert not os.path.exists(path + ".part")
+
+
+def test_download_resumes_partial_file(server, tmp_path):
+    path = str(tmp_path / "app.exe")
+    write(path + ".part", PAYLOAD[:100_000])
+    download(server.url, path, SHA256)
+    assert server.requests == ["bytes=100000-"]
+    assert read(path) == PAYLOAD
+
+
+def test_server_without_ranges_restarts_the_file(server, tmp_path):
+    server.ranges = False
+    path = str(tmp_path / "app.exe")
+    write(path + ".part", PAYLOAD[:100_000])
+    download(server.url, path, SHA256)
+    assert read(path) == PAYLOAD
+
+
+def test_complete_partial_file_is_installed_on_416(server, tmp_path):
+    path = str(tmp_path / "app.exe")
+    write(path + ".part", PAYLOAD)
+    download(server.url, path, SHA256)
+    assert server.requests == [f"bytes={len(PAYLOAD)}-"]
+    assert read(path) == PAYLOAD
+
+
+def test_oversized_partial_file_is_restarted_on_416(server, tmp_path):
+    path = str(tmp_path / "app.exe")
+    write(path + ".part", PAYLOAD + b"stale")
+    download(server.url, path, SHA256)
+    assert server.requests == [f"bytes={len(PAYLOAD) + 5}-", None]
+    assert read(path) == PAYLOAD
+
+
+def test_checksum_mismatch_keeps_the_old_file(server, tmp_path):
+    path = str(tmp_path / "app.exe")
+    write(path, b"old version")
+    with pytest.raises(UpdateError):
+        download(server.url, path, "0" * 64)
+    assert read(path) == b"old version"
+    assert not os.path.exists(path + ".part")
+
+
+def test_missing_checksum_is_refused(server, tmp_path):
+    path = str(tmp_path / "app.exe")
+    write(path, b"old version")
+    with pytest.raises(UpdateError):
+        download(server.url, path, None)
+    assert server.requests == []
+    assert read(path) == b"old version"